@@ -1,9 +1,13 @@
 from flask import Flask, request, jsonify
 from dotenv import load_dotenv
 import os
+import sys
 from sqlalchemy import create_engine
 
-from llama_index.core import SQLDatabase
+# Shared schema snapshot provider lives with the LangChain agents
+sys.path.insert(0, os.getenv("SCHEMA_INFO_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../../api/database_LLM_agent")))
+from schema_info import SchemaInfoProvider, llamaindex_sql_database
+
 from llama_index.core.query_engine import NLSQLTableQueryEngine
 from llama_index.llms.ollama import Ollama
 from llama_index.embeddings.huggingface import HuggingFaceEmbedding
@@ -17,7 +21,8 @@ app = Flask(__name__)
 # Oracle DB connection
 db_uri = f"oracle+oracledb://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_SERVICE')}"
 engine = create_engine(db_uri)
-sql_database = SQLDatabase(engine, include_tables=["employees", "sales"])
+schema_provider = SchemaInfoProvider(engine, include_tables=["employees", "sales"]).start()
+sql_database = llamaindex_sql_database(schema_provider)
 
 print(db_uri)
 
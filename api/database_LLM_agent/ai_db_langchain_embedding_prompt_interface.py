@@ -3,13 +3,16 @@ from sqlalchemy import create_engine, text
 from sentence_transformers import SentenceTransformer
 from langchain_community.llms import Ollama
 from langchain_core.prompts import PromptTemplate
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
 import os
 import datetime
 import decimal
 import json
-import pickle
+from itertools import product
+
+from example_store import ExampleIndex
+from sql_validator import generate_valid_sql, generate_first_valid_sql, server_timing
+from llm_registry import registry
 
 app = Flask(__name__)
 
@@ -31,29 +34,19 @@ LOCAL_EMBED_MODEL=os.getenv('LOCAL_EMBED_MODEL')
 embedder = SentenceTransformer(LOCAL_EMBED_MODEL)
 
 # -- Cache examples in memory --
-cached_examples = []
+example_index = ExampleIndex(engine, LOCAL_EMBED_MODEL)
+
+TOP_K_EXAMPLES = int(os.getenv("TOP_K_EXAMPLES", "3"))
 
 def fetch_examples_from_db():
-    global cached_examples
-    if cached_examples:
-        return cached_examples
-    with engine.connect() as conn:
-        result = conn.execute(text("SELECT example_input, example_sql, embedding FROM sql_prompt_examples_embedded"))
-        for row in result:
-            cached_examples.append({
-                "input": row[0],
-                "sql": row[1],
-                "embedding": pickle.loads(row[2].read()) if hasattr(row[2], 'read') else pickle.loads(row[2])
-            })
-    return cached_examples
+    return example_index.get()[0]
 
 def clear_example_cache():
-    global cached_examples
-    cached_examples = []
+    example_index.clear()
 
 # -- Prompt template --
 prompt_template = PromptTemplate(
-    input_variables=["question", "candidate_sql"],
+    input_variables=["question", "candidate_sql", "examples"],
     template="""
 You are an expert Oracle SQL assistant.
 
@@ -64,6 +57,9 @@ Given a user question and a candidate SQL query, return **only the final correct
 - Do not use triple backticks.
 - Just return the raw SQL.
 
+### Similar Examples:
+{examples}
+
 ### User Question:
 {question}
 
@@ -76,12 +72,47 @@ Given a user question and a candidate SQL query, return **only the final correct
 
 llm = Ollama(model="llama3.2:1b", temperature=0.0)
 
-def find_best_match(user_query):
-    user_vec = embedder.encode(user_query)
-    examples = fetch_examples_from_db()
-    similarities = [cosine_similarity([user_vec], [ex["embedding"]])[0][0] for ex in examples]
-    best_idx = int(np.argmax(similarities))
-    return examples[best_idx]
+# Speculative mode: N candidates at once, first one Oracle can parse is executed.
+# Candidate i uses SQL_CANDIDATE_TEMPERATURES[i] and the i-th best example as its candidate SQL.
+SQL_CANDIDATES = int(os.getenv("SQL_CANDIDATES", "1"))
+SQL_MAX_CANDIDATES = int(os.getenv("SQL_MAX_CANDIDATES", "4"))
+SQL_CANDIDATE_TEMPERATURES = [float(t) for t in os.getenv("SQL_CANDIDATE_TEMPERATURES", "0.0,0.3,0.6,0.9").split(",")]
+
+def find_top_matches(user_query, k=TOP_K_EXAMPLES):
+    """
+    Top-k examples by cosine similarity, best first, each with its "score".
+    One matrix-vector product over the cached matrix plus argpartition.
+    """
+    examples, matrix = example_index.get()
+    if not examples:
+        return []
+    user_vec = embedder.encode(user_query, normalize_embeddings=True).astype(np.float32)
+    scores = matrix @ user_vec
+    k = max(1, min(k, len(examples)))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return [dict(examples[i], score=float(scores[i])) for i in top]
+
+def format_examples(matches):
+    return "\n\n".join(f"Question: {m['input']}\nSQL: {m['sql']}" for m in matches)
+
+def speculative_candidates(user_input, matches, n):
+    """
+    [(label, llm, prompt)] varying temperature and which example seeds the candidate SQL.
+    At most one candidate per distinct (temperature, seed) pair, so n is capped
+    at len(SQL_CANDIDATE_TEMPERATURES) * len(matches).
+    """
+    examples = format_examples(matches)
+    n_temps, n_seeds = len(SQL_CANDIDATE_TEMPERATURES), len(matches)
+    # Diagonal order first (both vary from candidate to candidate), then the remaining pairs
+    pairs = list(dict.fromkeys(
+        [(i % n_temps, i % n_seeds) for i in range(n_temps * n_seeds)] + list(product(range(n_temps), range(n_seeds)))
+    ))
+    candidates = []
+    for i, (t, m) in enumerate(pairs[:n]):
+        prompt = prompt_template.format(question=user_input, candidate_sql=matches[m]["sql"], examples=examples)
+        candidates.append((f"c{i}", registry.llm("llama3.2:1b", temperature=SQL_CANDIDATE_TEMPERATURES[t]), prompt))
+    return candidates
 
 def serialize_row(row, columns):
     def serialize_value(val):
@@ -103,17 +134,40 @@ def query():
     if not user_input:
         return jsonify({"error": "Missing prompt"}), 400
 
-    best = find_best_match(user_input)
-    print("Best match:", best["input"])
-
-    prompt = prompt_template.format(question=user_input, candidate_sql=best["sql"])
+    try:
+        n_candidates = int(data.get("candidates", SQL_CANDIDATES))
+    except (TypeError, ValueError):
+        return jsonify({"error": "candidates must be an integer"}), 400
+    if n_candidates < 1:
+        return jsonify({"error": "candidates must be at least 1"}), 400
+    n_candidates = min(n_candidates, SQL_MAX_CANDIDATES)
+
+    matches = find_top_matches(user_input)
+    if not matches:
+        return jsonify({"error": "No SQL examples available"}), 503
+    best = matches[0]
+    print("Best match:", best["input"], round(best["score"], 3))
+
+    prompt = prompt_template.format(question=user_input, candidate_sql=best["sql"],
+                                    examples=format_examples(matches))
 
     try:
-        sql_query = llm(prompt).strip()
-        print("Generated SQL:\n", sql_query)
+        if n_candidates > 1:
+            validated = generate_first_valid_sql(
+                speculative_candidates(user_input, matches, n_candidates), engine)
+            print("Winning candidate:", validated["winner"])
+        else:
+            # Parse-check the SQL in Oracle (no execution) and let the LLM repair ORA- errors
+            validated = generate_valid_sql(llm, prompt, user_input, engine)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+    sql_query = validated["sql"]
+    timing = server_timing(validated["timings"])
+    print("Generated SQL:\n", sql_query, "\n", timing)
+    if validated["error"]:
+        return jsonify({"error": validated["error"], "sql": sql_query, "attempts": validated["attempts"]}), 422
+
     def generate():
         try:
             with engine.connect() as conn:
@@ -124,7 +178,9 @@ def query():
         except Exception as e:
             yield json.dumps({"error": str(e), "sql": sql_query}) + "\n"
 
-    return Response(stream_with_context(generate()), content_type="application/x-ndjson")
+    response = Response(stream_with_context(generate()), content_type="application/x-ndjson")
+    response.headers["Server-Timing"] = timing
+    return response
 
 # -- Route to clear example cache --
 @app.route("/cache/clear", methods=["POST"])
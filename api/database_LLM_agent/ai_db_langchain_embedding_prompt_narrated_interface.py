@@ -3,13 +3,17 @@ from sqlalchemy import create_engine, text
 from sentence_transformers import SentenceTransformer
 from langchain_community.llms import Ollama
 from langchain_core.prompts import PromptTemplate
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
 import os
 import datetime
 import decimal
 import json
-import pickle
+import queue
+import threading
+
+from example_store import ExampleIndex
+from result_summary import ResultSummary
+from sql_validator import generate_valid_sql, server_timing
 
 app = Flask(__name__)
 
@@ -25,31 +29,30 @@ print("db_uri====", db_uri)
 
 engine = create_engine(db_uri)
 
+# Rows kept (reservoir sample) alongside the summary statistics given to the narrator
+NARRATION_SAMPLE_ROWS = int(os.getenv("NARRATION_SAMPLE_ROWS", "20"))
+
+# Overlap: start narrating once NARRATION_EARLY_ROWS rows are in, while the rest still stream.
+# NARRATION_FINALIZE=annotate keeps that narration and notes the sample size;
+# NARRATION_FINALIZE=update keeps it and appends a short follow-up generated from
+# the complete aggregates (only the differences, so it is quick).
+NARRATION_OVERLAP = os.getenv("NARRATION_OVERLAP", "false").lower() == "true"
+NARRATION_EARLY_ROWS = int(os.getenv("NARRATION_EARLY_ROWS", "2000"))
+NARRATION_FINALIZE = os.getenv("NARRATION_FINALIZE", "annotate")
+
 LOCAL_EMBED_MODEL=os.getenv('LOCAL_EMBED_MODEL')
 
 # -- Load embedder --
 embedder = SentenceTransformer(LOCAL_EMBED_MODEL)
 
 # -- Cache examples in memory --
-cached_examples = []
+example_index = ExampleIndex(engine, LOCAL_EMBED_MODEL)
 
 def fetch_examples_from_db():
-    global cached_examples
-    if cached_examples:
-        return cached_examples
-    with engine.connect() as conn:
-        result = conn.execute(text("SELECT example_input, example_sql, embedding FROM sql_prompt_examples_embedded"))
-        for row in result:
-            cached_examples.append({
-                "input": row[0],
-                "sql": row[1],
-                "embedding": pickle.loads(row[2].read()) if hasattr(row[2], 'read') else pickle.loads(row[2])
-            })
-    return cached_examples
+    return example_index.get()[0]
 
 def clear_example_cache():
-    global cached_examples
-    cached_examples = []
+    example_index.clear()
 
 # -- Prompt template --
 prompt_template = PromptTemplate(
@@ -77,12 +80,136 @@ Given a user question and a candidate SQL query, return **only the final correct
 llm = Ollama(model="llama3.2:1b", temperature=0.0)
 
 def find_best_match(user_query):
-    user_vec = embedder.encode(user_query)
-    examples = fetch_examples_from_db()
-    similarities = [cosine_similarity([user_vec], [ex["embedding"]])[0][0] for ex in examples]
-    best_idx = int(np.argmax(similarities))
+    examples, matrix = example_index.get()
+    if not examples:
+        return None
+    user_vec = embedder.encode(user_query, normalize_embeddings=True).astype(np.float32)
+    best_idx = int(np.argmax(matrix @ user_vec))
     return examples[best_idx]
 
+def build_narration_prompt(user_input, sql_query, summary_dict):
+    return f"""
+        You are a helpful data analyst.
+        The user asked: "{user_input}"
+        The SQL query was:
+        {sql_query}
+
+        Summary statistics of the result (JSON), with a random sample of rows:
+        {json.dumps(summary_dict, indent=2, default=str)}
+
+        Write a short, clear narration describing the main findings without repeating all the raw data.
+        """
+
+def build_followup_prompt(user_input, early_text, based_on_rows, summary_dict):
+    return f"""
+        You are a helpful data analyst.
+        The user asked: "{user_input}"
+        This narration was written from the first {based_on_rows} rows of the result:
+        {early_text}
+
+        Summary statistics of the complete result (JSON):
+        {json.dumps(summary_dict, indent=2, default=str)}
+
+        In one or two sentences, state only what the complete result changes or adds.
+        Do not repeat the narration.
+        """
+
+def narration_event(text_so_far, partial):
+    # An empty "_narration" is falsy on the client and would render as a table row
+    event = {"_narration": text_so_far or "No narration generated."}
+    if partial:
+        event["_partial"] = True
+    return json.dumps(event) + "\n"
+
+def stream_narration(user_input, sql_query, summary):
+    """
+    Token-stream the narration as NDJSON "_narration" events. Each event carries
+    the text so far (the UI replaces the narration on every event); interim
+    events are flagged "_partial". Input is the constant-size ResultSummary,
+    not the raw rows.
+    """
+    narration_prompt = build_narration_prompt(user_input, sql_query, summary.to_dict())
+    narration_text = ""
+    try:
+        for chunk in llm.stream(narration_prompt):
+            if not chunk:
+                continue
+            narration_text += chunk
+            yield narration_event(narration_text, partial=True)
+        narration_text = narration_text.strip()
+    except Exception as e:
+        narration_text = f"Error generating narration: {str(e)}"
+
+    # Final narration as special object that table renderer will ignore
+    yield narration_event(narration_text, partial=False)
+
+def stream_followup(user_input, early, summary):
+    """
+    Finalize an early narration with a short update on the complete aggregates.
+    Events carry the early narration plus the update so far.
+    """
+    base = early.text.strip() + f"\n\nUpdate (all {summary.row_count} rows): "
+    update = ""
+    try:
+        followup_prompt = build_followup_prompt(user_input, early.text.strip(), early.based_on_rows,
+                                                summary.to_dict())
+        for chunk in llm.stream(followup_prompt):
+            if not chunk:
+                continue
+            update += chunk
+            yield narration_event(base + update, partial=True)
+        narration_text = base + update.strip()
+    except Exception as e:
+        narration_text = base + f"unavailable ({str(e)})"
+    yield narration_event(narration_text, partial=False)
+
+_NARRATION_DONE = object()
+
+class EarlyNarration:
+    """
+    Narration started in a worker thread from the aggregates of the first rows,
+    while the remaining rows are still streaming. Tokens arrive on a queue and
+    are turned into "_narration" events by events().
+    """
+
+    def __init__(self, narration_prompt, based_on_rows):
+        self.based_on_rows = based_on_rows
+        self.text = ""
+        self.error = None
+        self.done = False
+        self._tokens = queue.Queue()
+        self._cancelled = threading.Event()
+        threading.Thread(target=self._run, args=(narration_prompt,), daemon=True).start()
+
+    def _run(self, narration_prompt):
+        try:
+            for chunk in llm.stream(narration_prompt):
+                if self._cancelled.is_set():
+                    break
+                self._tokens.put(chunk)
+        except Exception as e:
+            self._tokens.put(e)
+        finally:
+            self._tokens.put(_NARRATION_DONE)
+
+    def has_tokens(self):
+        return not self._tokens.empty()
+
+    def events(self, block):
+        """Partial events for the tokens received so far; with block=True, until the LLM finishes."""
+        while not self.done and (block or not self._tokens.empty()):
+            item = self._tokens.get()
+            if item is _NARRATION_DONE:
+                self.done = True
+            elif isinstance(item, Exception):
+                self.error = item
+            elif item:
+                self.text += item
+                yield narration_event(self.text, partial=True)
+
+    def cancel(self):
+        self._cancelled.set()
+
 def serialize_row(row, columns):
     def serialize_value(val):
         if isinstance(val, (datetime.date, datetime.datetime)):
@@ -104,58 +231,77 @@ def query():
         return jsonify({"error": "Missing prompt"}), 400
 
     best = find_best_match(user_input)
+    if best is None:
+        return jsonify({"error": "No SQL examples available"}), 503
     print("Best match:", best["input"])
 
     prompt = prompt_template.format(question=user_input, candidate_sql=best["sql"])
 
     try:
-        sql_query = llm(prompt).strip()
-        print("Generated SQL:\n", sql_query)
+        # Parse-check the SQL in Oracle (no execution) and let the LLM repair ORA- errors
+        validated = generate_valid_sql(llm, prompt, user_input, engine)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+    sql_query = validated["sql"]
+    timing = server_timing(validated["timings"])
+    print("Generated SQL:\n", sql_query, "\n", timing)
+    if validated["error"]:
+        return jsonify({"error": validated["error"], "sql": sql_query, "attempts": validated["attempts"]}), 422
+
+    overlap = data.get("narration_overlap", NARRATION_OVERLAP)
+
     def generate():
+            early = None
             try:
-                all_rows = []
+                summary = None
                 with engine.connect() as conn:
                     result = conn.execution_options(stream_results=True).execute(text(sql_query))
-                    columns = result.keys()
+                    columns = list(result.keys())
+                    summary = ResultSummary(columns, sample_size=NARRATION_SAMPLE_ROWS)
 
                     # Send rows exactly as before (no 'type' field)
                     for row in result:
                         row_dict = serialize_row(row, columns)
-                        all_rows.append(row_dict)
+                        summary.add(row_dict)
                         yield json.dumps(row_dict) + "\n"
 
-
-
-                # After rows, send narration in its own NDJSON object
-                if all_rows:
-                    narration_prompt = f"""
-        You are a helpful data analyst.
-        The user asked: "{user_input}"
-        The SQL query was:
-        {sql_query}
-
-        The query returned the following rows (JSON):
-        {json.dumps(all_rows[:20], indent=2)}
-
-        Write a short, clear narration describing the main findings without repeating all the raw data.
-        """
-                    try:
-                        narration_text = llm(narration_prompt).strip()
-                    except Exception as e:
-                        narration_text = f"Error generating narration: {str(e)}"
-
-                    # Send narration as special object that table renderer will ignore
-                    yield json.dumps({"_narration": narration_text}) + "\n"
+                        if early is None:
+                            if overlap and summary.row_count == NARRATION_EARLY_ROWS:
+                                early = EarlyNarration(
+                                    build_narration_prompt(user_input, sql_query, summary.to_dict()),
+                                    summary.row_count,
+                                )
+                        elif early.has_tokens():
+                            yield from early.events(block=False)
+
+                if summary is None or not summary.row_count:
+                    return
+
+                if early is None:
+                    # After rows, stream narration as it is generated
+                    yield from stream_narration(user_input, sql_query, summary)
+                else:
+                    yield from early.events(block=True)
+                    if early.error is not None:
+                        yield narration_event(f"Error generating narration: {str(early.error)}", partial=False)
+                    elif summary.row_count == early.based_on_rows:
+                        yield narration_event(early.text.strip(), partial=False)
+                    elif NARRATION_FINALIZE == "update":
+                        yield from stream_followup(user_input, early, summary)
+                    else:
+                        yield narration_event(early.text.strip() + (f"\n\n(Based on the first {early.based_on_rows} "
+                                                                    f"of {summary.row_count} rows.)"), partial=False)
 
             except Exception as e:
                 yield json.dumps({"error": str(e), "sql": sql_query}) + "\n"
+            finally:
+                if early is not None:
+                    early.cancel()
 
-
-
-    return Response(stream_with_context(generate()), content_type="application/x-ndjson")
+    response = Response(stream_with_context(generate()), content_type="application/x-ndjson")
+    response.headers["Server-Timing"] = timing
+    return response
 
 # -- Route to clear example cache --
 @app.route("/cache/clear", methods=["POST"])
@@ -4,9 +4,6 @@ import os
 import re
 import time
 import diskcache
-from langchain_community.utilities import SQLDatabase
-from langchain.chains import create_sql_query_chain
-from langchain_community.llms import Ollama
 
 from langchain_core.prompts import PromptTemplate
 
@@ -16,6 +13,9 @@ from flask import Response, stream_with_context
 
 import json
 
+from llm_registry import registry
+from schema_info import SchemaInfoProvider, langchain_sql_database
+
 # Load .env for DB credentials
 load_dotenv()
 
@@ -45,7 +45,10 @@ engine = create_engine(
 )
 
 # Pass engine to SQLDatabase; specify tables for safety
-db = SQLDatabase(engine, include_tables=['sales', 'employees'])
+# Table DDL + sample rows come from a local snapshot refreshed in the background,
+# so neither startup nor chain invokes reflect the schema
+schema_provider = SchemaInfoProvider(engine, include_tables=['sales', 'employees']).start()
+db = langchain_sql_database(schema_provider)
 #db = SQLDatabase.from_uri(db_uri, include_tables=['sales', 'employees'])
 
 @app.route("/query", methods=["POST"])
@@ -59,8 +62,8 @@ def query_db():
 
     def generate():
         try:
-            # Dynamically instantiate LLM and chain
-            llm = Ollama(model=model,
+            # LLM and chain are built once per model and reused across requests
+            db_chain = registry.sql_chain(model, db,
                         temperature=0.0,
                         top_k=40,
                         repeat_penalty=1.1,
@@ -69,7 +72,6 @@ def query_db():
                         # max_tokens=300,
                         #stop=["\n\n"]
                 )
-            db_chain = create_sql_query_chain(llm, db)
 
             # If db_chain.invoke is not streamable, yield as one line
             result = db_chain.invoke({"question": prompt})
@@ -1,6 +1,6 @@
-from flask import Flask, request, jsonify, Response, stream_with_context
-from langchain_community.llms import Ollama
+from flask import Flask, request, jsonify, Response, stream_with_context, send_file
 from sqlalchemy import create_engine, text
+from sentence_transformers import SentenceTransformer
 import os
 import datetime
 import decimal
@@ -8,6 +8,11 @@ import json
 import hashlib
 import diskcache as dc  # ✅ Added for caching
 
+from example_selector import ExampleSelector
+from llm_registry import registry
+from ndjson_cache import write_through_cache, get_cached_file
+from sql_validator import generate_valid_sql, server_timing
+
 app = Flask(__name__)
 
 # Oracle DB connection setup
@@ -23,7 +28,27 @@ print("db_uri====", db_uri)
 engine = create_engine(db_uri)
 
 # Initialize persistent cache
-cache = dc.Cache("./query_cache")  # Folder-based cache
+# Entries expire after CACHE_TTL_SECONDS; results over CACHE_MAX_ROWS / CACHE_MAX_ENTRY_BYTES
+# are streamed but not cached; beyond CACHE_SIZE_LIMIT_BYTES the least recently used go first.
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "3600"))
+CACHE_MAX_ROWS = int(os.getenv("CACHE_MAX_ROWS", "100000"))
+CACHE_MAX_ENTRY_BYTES = int(os.getenv("CACHE_MAX_ENTRY_BYTES", str(50 * 1024 * 1024)))
+CACHE_SIZE_LIMIT_BYTES = int(os.getenv("CACHE_SIZE_LIMIT_BYTES", str(1024 * 1024 * 1024)))
+
+cache = dc.Cache(  # Folder-based cache
+    "./query_cache",
+    size_limit=CACHE_SIZE_LIMIT_BYTES,
+    eviction_policy="least-recently-used",
+)
+
+# Few-shot examples: only the most relevant ones that fit the token budget go into the prompt
+FEW_SHOT_K = int(os.getenv("FEW_SHOT_K", "4"))
+FEW_SHOT_TOKEN_BUDGET = int(os.getenv("FEW_SHOT_TOKEN_BUDGET", "1200"))
+EXAMPLE_REFRESH_SECONDS = float(os.getenv("EXAMPLE_REFRESH_SECONDS", "30"))
+
+embedder = SentenceTransformer(os.getenv('LOCAL_EMBED_MODEL'))
+example_selector = ExampleSelector(engine, embedder, k=FEW_SHOT_K, token_budget=FEW_SHOT_TOKEN_BUDGET,
+                                   refresh_seconds=EXAMPLE_REFRESH_SECONDS)
 
 BASE_INSTRUCTIONS = """
 You are an expert Oracle SQL assistant.
@@ -47,16 +72,9 @@ Do NOT generate SQL for the example Inputs.
 ### Examples:
 """
 
-def fetch_examples_from_db():
-    with engine.connect() as conn:
-        result = conn.execute(text("SELECT example_input, example_output FROM sql_prompt_examples ORDER BY id"))
-        return result.fetchall()
-
 def build_prompt(user_input):
-    examples = fetch_examples_from_db()
-    example_text = ""
-    for inp, outp in examples:
-        example_text += f"Input: {inp}\n\nOutput:\n{outp}\n\n---\n\n"
+    examples = example_selector.select(user_input)
+    example_text = example_selector.format(examples)
     return f"""{BASE_INSTRUCTIONS}{example_text}Only output the SQL for this Input:\n\nInput: {user_input}\n\nOutput:\n"""
 
 def serialize_row(row, columns):
@@ -85,51 +103,51 @@ def query():
 
     prompt_hash = hash_prompt(prompt)
 
-    if prompt_hash in cache:
-        sql_query = cache[prompt_hash]["sql"]
-        cached_result = cache[prompt_hash]["results"]
-        print("✅ Using cached SQL and results.")
-        def stream_cached():
-            for row in cached_result:
-                yield json.dumps(row) + "\n"
-        return Response(stream_with_context(stream_cached()), content_type="application/x-ndjson")
+    # Single lookup: file handle to the cached NDJSON plus the SQL stored as its tag
+    cached_file, cached_sql = get_cached_file(cache, prompt_hash, tag=True)
+    if cached_file is not None:
+        print("✅ Using cached SQL and results:", cached_sql)
+        return send_file(cached_file, mimetype="application/x-ndjson")
 
     # Run LLM to get SQL
-    llm = Ollama(
-        model=model_name,
+    llm = registry.llm(
+        model_name,
         temperature=0.0,
         top_k=40,
         top_p=0.9
     )
 
     try:
-        sql_query = llm(prompt).strip()
-        print("Generated SQL:\n", sql_query)
+        # Parse-check the SQL in Oracle (no execution) and let the LLM repair ORA- errors
+        validated = generate_valid_sql(llm, prompt, user_input, engine)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+    sql_query = validated["sql"]
+    timing = server_timing(validated["timings"])
+    print("Generated SQL:\n", sql_query, "\n", timing)
+    if validated["error"]:
+        return jsonify({"error": validated["error"], "sql": sql_query, "attempts": validated["attempts"]}), 422
+
     # Run and stream + cache results
+    def stream_rows():
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True).execute(text(sql_query))
+            columns = result.keys()
+            for row in result:
+                yield json.dumps(serialize_row(row, columns)) + "\n"
+
     def stream_and_cache():
-        results_to_cache = []
         try:
-            with engine.connect() as conn:
-                result = conn.execution_options(stream_results=True).execute(text(sql_query))
-                columns = result.keys()
-                for row in result:
-                    row_dict = serialize_row(row, columns)
-                    results_to_cache.append(row_dict)
-                    yield json.dumps(row_dict) + "\n"
-
-            # Store SQL and full result
-            cache[prompt_hash] = {
-                "sql": sql_query,
-                "results": results_to_cache
-            }
-
+            yield from write_through_cache(cache, prompt_hash, stream_rows(), expire=CACHE_TTL_SECONDS,
+                                           tag=sql_query, max_rows=CACHE_MAX_ROWS,
+                                           max_bytes=CACHE_MAX_ENTRY_BYTES)
         except Exception as e:
             yield json.dumps({"error": str(e)}) + "\n"
 
-    return Response(stream_with_context(stream_and_cache()), content_type="application/x-ndjson")
+    response = Response(stream_with_context(stream_and_cache()), content_type="application/x-ndjson")
+    response.headers["Server-Timing"] = timing
+    return response
 
 @app.route("/health", methods=["GET"])
 def health():
@@ -149,6 +167,7 @@ def cache_info():
 @app.route("/clear-cache", methods=["POST"])
 def clear_cache():
     cache.clear()
+    example_selector.invalidate()
     return jsonify({"status": "cache cleared", "count": len(cache)})
 
 
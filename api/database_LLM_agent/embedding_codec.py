@@ -0,0 +1,79 @@
+"""
+embedding_codec.py
+
+Portable binary format for the embedding BLOBs in sql_prompt_examples_embedded
+(replaces pickle.dumps(numpy_array), which is slow, NumPy-version bound and
+unsafe to load).
+
+Layout (all little-endian):
+    magic     4 bytes   b"EMB1"
+    dtype     1 byte    1 = float32
+    reserved  1 byte
+    dim       uint32
+    model_len uint16
+    model     model_len bytes, utf-8 model id
+    payload   dim * 4 bytes, float32
+"""
+
+import os
+import struct
+from typing import List, Tuple
+
+import numpy as np
+
+MAGIC = b"EMB1"
+_HEADER = struct.Struct("<4sBBIH")
+_DTYPES = {1: np.dtype("<f4")}
+_DTYPE_CODES = {v: k for k, v in _DTYPES.items()}
+
+
+def model_id_for(model_path: str) -> str:
+    """
+    Stable id for a sentence-transformers model given by name or local path.
+    EMBED_MODEL_ID overrides it (e.g. when the same model lives at different paths).
+    """
+    return os.environ.get("EMBED_MODEL_ID") or os.path.basename((model_path or "").rstrip("/\\"))
+
+
+def encode_embedding(vec, model_id: str) -> bytes:
+    arr = np.asarray(vec, dtype="<f4").ravel()
+    model = model_id.encode("utf-8")
+    header = _HEADER.pack(MAGIC, _DTYPE_CODES[arr.dtype], 0, arr.size, len(model))
+    return header + model + arr.tobytes()
+
+
+def is_encoded(blob: bytes) -> bool:
+    return bytes(blob[:4]) == MAGIC
+
+
+def decode_header(blob: bytes) -> Tuple[str, int, np.dtype, int]:
+    """Returns (model_id, dim, dtype, payload_offset)."""
+    if not is_encoded(blob):
+        raise ValueError("Not an EMB1 embedding blob (legacy pickle row? run migrate_embeddings.py)")
+    _, code, _, dim, model_len = _HEADER.unpack_from(blob)
+    offset = _HEADER.size + model_len
+    model = bytes(blob[_HEADER.size:offset]).decode("utf-8")
+    return model, dim, _DTYPES[code], offset
+
+
+def decode_embedding(blob: bytes) -> np.ndarray:
+    _, dim, dtype, offset = decode_header(blob)
+    return np.frombuffer(blob, dtype=dtype, count=dim, offset=offset)
+
+
+def load_matrix(blobs: List[bytes]) -> Tuple[np.ndarray, str]:
+    """
+    Decode many blobs into one preallocated (n, dim) float32 matrix.
+    Each payload is viewed in place with np.frombuffer and copied once,
+    straight into its matrix row. Returns (matrix, model_id).
+    """
+    if not blobs:
+        return np.zeros((0, 0), dtype=np.float32), ""
+    model, dim, _, _ = decode_header(blobs[0])
+    matrix = np.empty((len(blobs), dim), dtype=np.float32)
+    for i, blob in enumerate(blobs):
+        row_model, row_dim, dtype, offset = decode_header(blob)
+        if row_dim != dim or row_model != model:
+            raise ValueError(f"Mixed embeddings: row {i} is {row_model}/{row_dim}, expected {model}/{dim}")
+        matrix[i] = np.frombuffer(blob, dtype=dtype, count=dim, offset=offset)
+    return matrix, model
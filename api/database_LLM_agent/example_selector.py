@@ -0,0 +1,102 @@
+"""
+example_selector.py
+
+Few-shot example selection for prompt-based SQL generation:
+- Examples from sql_prompt_examples are cached in memory and embedded once
+- Change detection via COUNT(*)/MAX(ORA_ROWSCN), polled at most every refresh_seconds
+- Per request, picks the k most similar examples that fit a token budget,
+  counted with a local tokenizer, so prompt size stays flat as the table grows
+"""
+
+import threading
+import time
+from typing import List, Tuple
+
+import numpy as np
+from sqlalchemy import text
+
+
+class ExampleSelector:
+
+    def __init__(self, engine, embedder, k: int = 4, token_budget: int = 1200,
+                 refresh_seconds: float = 30, tokenizer=None,
+                 example_format: str = "Input: {input}\n\nOutput:\n{output}\n\n---\n\n"):
+        self.engine = engine
+        self.embedder = embedder
+        self.k = k
+        self.token_budget = token_budget
+        self.refresh_seconds = refresh_seconds
+        self.tokenizer = tokenizer or embedder.tokenizer
+        self.example_format = example_format
+
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._fingerprint = None
+        # (examples, normalised matrix, token counts), replaced as a whole on reload
+        self._state = ([], np.zeros((0, 0), dtype=np.float32), np.zeros(0, dtype=np.int64))
+
+    def count_tokens(self, text_: str) -> int:
+        return len(self.tokenizer.encode(text_, add_special_tokens=False))
+
+    def format(self, examples: List[Tuple[str, str]]) -> str:
+        return "".join(self.example_format.format(input=i, output=o) for i, o in examples)
+
+    def select(self, user_input: str) -> List[Tuple[str, str]]:
+        """
+        Up to k (input, output) pairs by similarity whose formatted text fits
+        token_budget. Ordered so the closest example sits right above the question.
+        """
+        examples, matrix, tokens = self._current()
+        if not examples:
+            return []
+        query = self.embedder.encode(user_input, normalize_embeddings=True).astype(np.float32)
+        scores = matrix @ query
+        k = min(self.k, len(examples))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        chosen, used = [], 0
+        for i in top:
+            if used + tokens[i] > self.token_budget:
+                continue
+            chosen.append(examples[i])
+            used += int(tokens[i])
+        return chosen[::-1]
+
+    def invalidate(self):
+        with self._lock:
+            self._fingerprint = None
+            self._checked_at = 0.0
+
+    # -------------------------------------------------------------------------
+    def _current(self):
+        if time.monotonic() - self._checked_at >= self.refresh_seconds:
+            with self._lock:
+                if time.monotonic() - self._checked_at >= self.refresh_seconds:
+                    self._refresh()
+        return self._state
+
+    def _refresh(self):
+        with self.engine.connect() as conn:
+            count, scn = conn.execute(
+                text("SELECT COUNT(*), NVL(MAX(ORA_ROWSCN), 0) FROM sql_prompt_examples")
+            ).one()
+            fingerprint = (int(count), int(scn))
+            if fingerprint != self._fingerprint:
+                rows = conn.execute(
+                    text("SELECT example_input, example_output FROM sql_prompt_examples ORDER BY id")
+                ).fetchall()
+                self._load(rows)
+                self._fingerprint = fingerprint
+        self._checked_at = time.monotonic()
+
+    def _load(self, rows):
+        examples = [(inp, outp.read() if hasattr(outp, "read") else outp) for inp, outp in rows]
+        if not examples:
+            self._state = ([], np.zeros((0, 0), dtype=np.float32), np.zeros(0, dtype=np.int64))
+            return
+        matrix = self.embedder.encode([inp for inp, _ in examples], normalize_embeddings=True,
+                                      batch_size=64).astype(np.float32)
+        tokens = np.array([self.count_tokens(self.format([ex])) for ex in examples], dtype=np.int64)
+        print(f"Loaded {len(examples)} prompt examples")
+        self._state = (examples, matrix, tokens)
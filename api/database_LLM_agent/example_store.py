@@ -0,0 +1,64 @@
+"""
+example_store.py
+
+In-memory copy of sql_prompt_examples_embedded for the embedding prompt agents:
+- Loads the examples and their embeddings (embedding_codec BLOBs) on first use;
+  legacy pickle rows are skipped until migrate_embeddings.py has run
+- Keeps (examples, matrix) as one tuple, replaced atomically, so a reader
+  always gets a matching pair: row i of the L2-normalised float32 matrix
+  embeds examples[i]
+- An empty table is not cached, so examples added later are picked up
+"""
+
+import threading
+from typing import Dict, List, Tuple
+
+import numpy as np
+from sqlalchemy import text
+
+from embedding_codec import is_encoded, load_matrix, model_id_for
+
+EXAMPLES_SQL = "SELECT example_input, example_sql, embedding FROM sql_prompt_examples_embedded"
+
+
+class ExampleIndex:
+
+    def __init__(self, engine, embed_model: str):
+        self.engine = engine
+        self.embed_model = embed_model
+        self._index = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Tuple[List[Dict[str, str]], np.ndarray]:
+        """The cached (examples, matrix) pair, loaded on first use."""
+        index = self._index
+        if index is not None:
+            return index
+        with self._lock:
+            if self._index is not None:
+                return self._index
+            index = self._read()
+            if index[0]:
+                self._index = index
+            return index
+
+    def clear(self):
+        self._index = None
+
+    def _read(self) -> Tuple[List[Dict[str, str]], np.ndarray]:
+        examples, blobs = [], []
+        with self.engine.connect() as conn:
+            for row in conn.execute(text(EXAMPLES_SQL)):
+                blob = row[2].read() if hasattr(row[2], 'read') else row[2]
+                if not is_encoded(blob):
+                    print("Skipping legacy pickle embedding (run migrate_embeddings.py):", row[0])
+                    continue
+                examples.append({"input": row[0], "sql": row[1]})
+                blobs.append(blob)
+        if not examples:
+            return [], np.zeros((0, 0), dtype=np.float32)
+        matrix, model = load_matrix(blobs)
+        if model != model_id_for(self.embed_model):
+            print(f"Warning: examples embedded with {model}, embedder is {model_id_for(self.embed_model)}")
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        return examples, matrix
@@ -0,0 +1,67 @@
+"""
+llm_registry.py
+
+Process-wide registry of Ollama LLM objects and SQL query chains:
+- One instance per (model, params), reused across requests, LRU-evicted
+- Every LLM sends Ollama's keep_alive hint so the model stays resident
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+from langchain.chains import create_sql_query_chain
+from langchain_community.llms import Ollama
+
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+LLM_REGISTRY_SIZE = int(os.getenv("LLM_REGISTRY_SIZE", "8"))
+
+
+class LLMRegistry:
+
+    def __init__(self, max_entries: int = LLM_REGISTRY_SIZE, keep_alive=OLLAMA_KEEP_ALIVE):
+        self.max_entries = max_entries
+        self.keep_alive = keep_alive
+        self._llms = OrderedDict()
+        self._chains = OrderedDict()
+        # Re-entrant: building a chain looks up its LLM under the same lock
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _key(model, params):
+        return (model, tuple(sorted(params.items())))
+
+    def _lookup(self, store, key, factory):
+        with self._lock:
+            obj = store.get(key)
+            if obj is not None:
+                store.move_to_end(key)
+                return obj
+            obj = factory()
+            store[key] = obj
+            while len(store) > self.max_entries:
+                store.popitem(last=False)
+            return obj
+
+    def llm(self, model: str, **params) -> Ollama:
+        return self._lookup(
+            self._llms,
+            self._key(model, params),
+            lambda: Ollama(model=model, keep_alive=self.keep_alive, **params),
+        )
+
+    def sql_chain(self, model: str, db, **params):
+        key = (id(db),) + self._key(model, params)
+        return self._lookup(
+            self._chains,
+            key,
+            lambda: create_sql_query_chain(self.llm(model, **params), db),
+        )
+
+    def clear(self):
+        with self._lock:
+            self._llms.clear()
+            self._chains.clear()
+
+
+registry = LLMRegistry()
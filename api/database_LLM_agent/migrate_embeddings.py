@@ -0,0 +1,64 @@
+"""
+One-off migration of sql_prompt_examples_embedded.embedding from pickle BLOBs
+to the EMB1 format in embedding_codec.py.
+
+  python migrate_embeddings.py            # convert pickled vectors in place
+  python migrate_embeddings.py --reembed  # re-encode example_input instead of unpickling
+
+--reembed never calls pickle.loads, use it if the table content is not trusted.
+"""
+
+import argparse
+import os
+import pickle
+
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+
+from embedding_codec import encode_embedding, is_encoded, model_id_for
+
+load_dotenv()
+
+db_uri = f"oracle+oracledb://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT', '1521')}/?service_name={os.getenv('DB_SERVICE')}"
+engine = create_engine(db_uri)
+
+MODEL_ID = model_id_for(os.getenv('LOCAL_EMBED_MODEL'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert pickled example embeddings to EMB1 blobs")
+    parser.add_argument("--reembed", action="store_true", help="re-encode example_input with LOCAL_EMBED_MODEL")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT id, example_input, embedding FROM sql_prompt_examples_embedded")).fetchall()
+
+    legacy = []
+    for id_, example_input, emb in rows:
+        blob = emb.read() if hasattr(emb, 'read') else emb
+        if blob is None or not is_encoded(blob):
+            legacy.append((id_, example_input, blob))
+    print(f"{len(legacy)} of {len(rows)} rows need migration")
+    if not legacy:
+        return
+
+    if args.reembed:
+        from sentence_transformers import SentenceTransformer
+        embedder = SentenceTransformer(os.getenv('LOCAL_EMBED_MODEL'))
+        vectors = embedder.encode([r[1] for r in legacy], batch_size=64)
+    else:
+        vectors = [np.asarray(pickle.loads(blob), dtype=np.float32) for _, _, blob in legacy]
+
+    updates = [{"id": id_, "emb": encode_embedding(vec, MODEL_ID)} for (id_, _, _), vec in zip(legacy, vectors)]
+    with engine.begin() as conn:
+        for start in range(0, len(updates), args.batch_size):
+            # A list of parameter dicts runs as one executemany per batch
+            conn.execute(text("UPDATE sql_prompt_examples_embedded SET embedding = :emb WHERE id = :id"),
+                         updates[start:start + args.batch_size])
+    print(f"Migrated {len(updates)} rows to EMB1 ({MODEL_ID})")
+
+
+if __name__ == "__main__":
+    main()
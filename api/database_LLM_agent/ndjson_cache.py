@@ -0,0 +1,58 @@
+"""
+ndjson_cache.py
+
+diskcache helpers for caching streamed NDJSON result sets as files:
+- write_through_cache tees the stream into a spill file and stores the file
+  only when the stream completed within the row/byte caps
+- get_cached_file returns a readable file for a hit; entries from older
+  versions that are not files (e.g. pickled dicts) are deleted and reported
+  as misses
+"""
+
+import tempfile
+
+
+def write_through_cache(cache, key, lines, expire=None, tag=None, max_rows=None, max_bytes=None):
+    """
+    Yield NDJSON lines while spilling them to a temp file in the cache
+    directory. On clean completion within max_rows / max_bytes the file
+    becomes the cache entry (stored as-is, read=True); aborted or oversized
+    streams are dropped.
+    """
+    spill = tempfile.TemporaryFile(dir=cache.directory)
+    rows = size = 0
+    completed = False
+    try:
+        for line in lines:
+            if spill is not None:
+                chunk = line.encode("utf-8")
+                rows += 1
+                size += len(chunk)
+                if (max_rows is not None and rows > max_rows) or (max_bytes is not None and size > max_bytes):
+                    spill.close()
+                    spill = None
+                else:
+                    spill.write(chunk)
+            yield line
+        completed = True
+    finally:
+        if hasattr(lines, "close"):
+            lines.close()
+        if spill is not None:
+            if completed:
+                spill.seek(0)
+                cache.set(key, spill, read=True, expire=expire, tag=tag)
+            spill.close()
+
+
+def get_cached_file(cache, key, tag=False):
+    """
+    File handle for a cached stream, or None on a miss. With tag=True returns
+    (file, tag) like cache.get(..., tag=True).
+    """
+    value, value_tag = cache.get(key, read=True, tag=True)
+    if value is not None and not hasattr(value, "read"):
+        # Stored by an older version as a pickled object
+        cache.delete(key)
+        value, value_tag = None, None
+    return (value, value_tag) if tag else value
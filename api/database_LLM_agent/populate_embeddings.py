@@ -1,9 +1,10 @@
 from sqlalchemy import create_engine, text
 from sentence_transformers import SentenceTransformer
 import os
-import pickle
 from dotenv import load_dotenv
 
+from embedding_codec import encode_embedding, model_id_for
+
 load_dotenv()
 
 
@@ -46,7 +47,7 @@ embedder = SentenceTransformer(os.getenv('LOCAL_EMBED_MODEL'))
 with engine.begin() as conn:  # `begin()` handles transactions cleanly
     for ex in sql_examples:
         embedding_vector = embedder.encode(ex["input"])
-        embedding_blob = pickle.dumps(embedding_vector)
+        embedding_blob = encode_embedding(embedding_vector, model_id_for(os.getenv('LOCAL_EMBED_MODEL')))
         conn.execute(
             text("""
                 INSERT INTO sql_prompt_examples_embedded (example_input, example_sql, embedding)
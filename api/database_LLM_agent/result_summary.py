@@ -0,0 +1,103 @@
+"""
+result_summary.py
+
+Constant-memory summary of a streamed result set, used as narration input
+instead of the raw row list:
+- row count, per-column null counts
+- numeric columns: min / max / sum / mean
+- text columns: most frequent values (capped counter) and, when the result has
+  a numeric measure, the top groups by that measure
+- a reservoir sample of rows (uniform over the whole stream)
+"""
+
+import random
+from typing import Any, Dict, List
+
+
+class ResultSummary:
+
+    def __init__(self, columns, sample_size: int = 20, max_distinct: int = 200, top_n: int = 5, seed=None):
+        self.columns = list(columns)
+        self.sample_size = sample_size
+        self.max_distinct = max_distinct
+        self.top_n = top_n
+        self.row_count = 0
+        self.sample: List[Dict[str, Any]] = []
+        self._rng = random.Random(seed)
+        self._nulls = {c: 0 for c in self.columns}
+        self._numeric: Dict[str, Dict[str, float]] = {}
+        self._counts: Dict[str, Dict[Any, int]] = {}
+        self._group_sums: Dict[str, Dict[Any, float]] = {}
+        self._measure = None
+
+    def add(self, row: Dict[str, Any]):
+        self.row_count += 1
+
+        # Reservoir sampling (Algorithm R)
+        if len(self.sample) < self.sample_size:
+            self.sample.append(row)
+        else:
+            j = self._rng.randrange(self.row_count)
+            if j < self.sample_size:
+                self.sample[j] = row
+
+        for col in self.columns:
+            val = row.get(col)
+            if val is None:
+                self._nulls[col] += 1
+            elif isinstance(val, (int, float)) and not isinstance(val, bool):
+                stats = self._numeric.get(col)
+                if stats is None:
+                    self._numeric[col] = {"min": val, "max": val, "sum": val, "count": 1}
+                    if self._measure is None:
+                        self._measure = col
+                else:
+                    stats["min"] = min(stats["min"], val)
+                    stats["max"] = max(stats["max"], val)
+                    stats["sum"] += val
+                    stats["count"] += 1
+            else:
+                self._bump(self._counts.setdefault(col, {}), val, 1)
+
+        if self._measure is not None:
+            measure = row.get(self._measure)
+            if isinstance(measure, (int, float)):
+                for col in self._counts:
+                    val = row.get(col)
+                    if val is not None:
+                        self._bump(self._group_sums.setdefault(col, {}), val, measure)
+
+    def _bump(self, counter: Dict[Any, float], key, amount):
+        if key in counter:
+            counter[key] += amount
+        elif len(counter) < self.max_distinct:
+            counter[key] = amount
+        # beyond max_distinct new keys are dropped: memory stays bounded
+
+    def to_dict(self) -> Dict[str, Any]:
+        numeric = {
+            col: {
+                "min": s["min"],
+                "max": s["max"],
+                "sum": round(s["sum"], 4),
+                "mean": round(s["sum"] / s["count"], 4),
+            }
+            for col, s in self._numeric.items()
+        }
+        top_values = {
+            col: sorted(counts.items(), key=lambda kv: kv[1], reverse=True)[:self.top_n]
+            for col, counts in self._counts.items()
+        }
+        top_groups = {
+            col: [(k, round(v, 4)) for k, v in sorted(sums.items(), key=lambda kv: kv[1], reverse=True)[:self.top_n]]
+            for col, sums in self._group_sums.items()
+        }
+        return {
+            "row_count": self.row_count,
+            "columns": self.columns,
+            "null_counts": {c: n for c, n in self._nulls.items() if n},
+            "numeric_columns": numeric,
+            "top_values": top_values,
+            "top_groups_by_" + (self._measure or "measure"): top_groups,
+            "sample_rows": self.sample,
+        }
@@ -0,0 +1,209 @@
+"""
+schema_info.py
+
+Cached schema reflection for the text-to-SQL agents:
+- Snapshots each table's DDL and sample rows (and a one-line column summary)
+  to a local JSON file, so startup loads it instead of reflecting the database
+- Refreshes the snapshot in a background thread every refresh_seconds
+- Serves the table info to LangChain (get_table_info) and LlamaIndex
+  (get_single_table_info) through thin SQLDatabase subclasses that do not
+  reflect the tables themselves
+
+Framework imports are done inside the adapter functions, so the provider itself
+only needs SQLAlchemy.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import MetaData, select
+from sqlalchemy.schema import CreateTable
+
+SCHEMA_CACHE_PATH = os.getenv("SCHEMA_CACHE_PATH", "./schema_cache/schema_info.json")
+SCHEMA_REFRESH_SECONDS = float(os.getenv("SCHEMA_REFRESH_SECONDS", "3600"))
+
+
+class SchemaInfoProvider:
+
+    def __init__(self, engine, include_tables: Iterable[str], schema: Optional[str] = None,
+                 cache_path: str = SCHEMA_CACHE_PATH, refresh_seconds: float = SCHEMA_REFRESH_SECONDS,
+                 sample_rows: int = 3, max_string_length: int = 100):
+        self.engine = engine
+        self.include_tables = sorted(t.lower() for t in include_tables)
+        self.schema = schema
+        self.cache_path = cache_path
+        self.refresh_seconds = refresh_seconds
+        self.sample_rows = sample_rows
+        self.max_string_length = max_string_length
+
+        self._tables: Dict[str, Dict[str, str]] = {}
+        self._refreshed_at = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # -------------------------------------------------------------------------
+    # Lifecycle
+    # -------------------------------------------------------------------------
+    def start(self):
+        """Load the snapshot (or reflect once if there is none) and start background refresh."""
+        if not self._read_snapshot():
+            self.refresh()
+        if self.refresh_seconds > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._refresh_loop, name="schema-refresh", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def refresh(self):
+        metadata = MetaData()
+        metadata.reflect(bind=self.engine, only=self.include_tables, schema=self.schema)
+        tables = {}
+        with self.engine.connect() as conn:
+            for table in metadata.sorted_tables:
+                tables[table.name] = {
+                    "info": self._render_info(conn, table),
+                    "summary": self._render_summary(table),
+                }
+        with self._lock:
+            self._tables = tables
+            self._refreshed_at = time.time()
+        self._write_snapshot()
+
+    def _refresh_loop(self):
+        # A snapshot older than the interval is refreshed right away
+        delay = max(0.0, self._refreshed_at + self.refresh_seconds - time.time())
+        while not self._stop.wait(delay):
+            try:
+                self.refresh()
+            except Exception as e:
+                print("schema refresh failed:", e)
+            delay = self.refresh_seconds
+
+    # -------------------------------------------------------------------------
+    # Read interface (same names as LangChain / LlamaIndex SQLDatabase)
+    # -------------------------------------------------------------------------
+    def get_usable_table_names(self) -> List[str]:
+        return sorted(self._tables)
+
+    def get_table_info(self, table_names: Optional[List[str]] = None) -> str:
+        tables = self._tables
+        names = [t.lower() for t in table_names] if table_names else sorted(tables)
+        missing = set(names) - set(tables)
+        if missing:
+            raise ValueError(f"table_names {missing} not found in schema snapshot")
+        return "\n\n".join(tables[n]["info"] for n in names)
+
+    def get_single_table_info(self, table_name: str) -> str:
+        return self._tables[table_name.lower()]["summary"]
+
+    # -------------------------------------------------------------------------
+    # Rendering
+    # -------------------------------------------------------------------------
+    def _render_info(self, conn, table) -> str:
+        create = str(CreateTable(table).compile(self.engine)).rstrip()
+        if not self.sample_rows:
+            return create
+        columns = [c.name for c in table.columns]
+        try:
+            rows = conn.execute(select(table).limit(self.sample_rows)).fetchall()
+            lines = ["\t".join(str(v)[:self.max_string_length] for v in row) for row in rows]
+        except Exception:
+            lines = []
+        sample = "\n".join(["\t".join(columns)] + lines)
+        return f"{create}\n\n/*\n{self.sample_rows} rows from {table.name} table:\n{sample}\n*/"
+
+    @staticmethod
+    def _render_summary(table) -> str:
+        columns = ", ".join(f"{c.name} ({c.type})" for c in table.columns)
+        fks = ", ".join(
+            f"{fk.parent.name} -> {fk.column.table.name}.{fk.column.name}"
+            for fk in table.foreign_keys
+        )
+        return f"Table '{table.name}' has columns: {columns}, and foreign keys: {fks}."
+
+    # -------------------------------------------------------------------------
+    # Snapshot file
+    # -------------------------------------------------------------------------
+    def _read_snapshot(self) -> bool:
+        try:
+            with open(self.cache_path) as f:
+                snap = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if snap.get("include_tables") != self.include_tables or snap.get("schema") != self.schema:
+            return False
+        with self._lock:
+            self._tables = snap["tables"]
+            self._refreshed_at = snap.get("refreshed_at", 0.0)
+        return True
+
+    def _write_snapshot(self):
+        os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+        tmp = self.cache_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({
+                "include_tables": self.include_tables,
+                "schema": self.schema,
+                "refreshed_at": self._refreshed_at,
+                "tables": self._tables,
+            }, f)
+        os.replace(tmp, self.cache_path)
+
+
+# -----------------------------------------------------------------------------
+# Framework adapters
+# -----------------------------------------------------------------------------
+def langchain_sql_database(provider: SchemaInfoProvider, **kwargs):
+    """LangChain SQLDatabase that skips startup reflection and answers table info from the provider."""
+    from langchain_community.utilities import SQLDatabase
+
+    class CachedSQLDatabase(SQLDatabase):
+        def get_usable_table_names(self):
+            return provider.get_usable_table_names()
+
+        def get_table_info(self, table_names=None):
+            return provider.get_table_info(table_names)
+
+    return CachedSQLDatabase(provider.engine, schema=provider.schema, include_tables=provider.include_tables,
+                             lazy_table_reflection=True, **kwargs)
+
+
+def llamaindex_sql_database(provider: SchemaInfoProvider, metadata: Optional[MetaData] = None, **kwargs):
+    """
+    LlamaIndex SQLDatabase that skips startup reflection and answers per-table
+    context from the provider. Its __init__ reflects every included table, so
+    it is replaced by one that sets the same fields from the provider.
+    """
+    from llama_index.core import SQLDatabase
+    from sqlalchemy import inspect
+
+    class CachedSQLDatabase(SQLDatabase):
+        def __init__(self):
+            tables = set(provider.include_tables)
+            self._engine = provider.engine
+            self._schema = provider.schema
+            self._inspector = inspect(provider.engine)
+            self._all_tables = tables
+            self._include_tables = tables
+            self._ignore_tables = set()
+            self._usable_tables = tables
+            self._sample_rows_in_table_info = kwargs.get("sample_rows_in_table_info", provider.sample_rows)
+            self._indexes_in_table_info = kwargs.get("indexes_in_table_info", False)
+            self._custom_table_info = kwargs.get("custom_table_info")
+            self._view_support = kwargs.get("view_support", False)
+            self._max_string_length = kwargs.get("max_string_length", provider.max_string_length)
+            self._metadata = metadata or MetaData()   # left empty, like LangChain's lazy reflection
+
+        def get_usable_table_names(self):
+            return provider.get_usable_table_names()
+
+        def get_single_table_info(self, table_name):
+            return provider.get_single_table_info(table_name)
+
+    return CachedSQLDatabase()
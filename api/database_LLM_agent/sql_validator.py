@@ -0,0 +1,159 @@
+"""
+sql_validator.py
+
+Validate LLM-generated SQL before running it:
+- cursor.parse() lets Oracle parse a query without executing it; only
+  SELECT / WITH statements are sent, since Oracle executes (and commits) DDL
+  at parse time
+- on ORA- errors the error is fed back to the model for up to max_repairs
+  repair attempts
+- every stage is timed; timings render as a Server-Timing header
+- speculative mode: several candidates generated concurrently, the first one
+  that parses wins and the others are cancelled mid-generation
+"""
+
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Tuple
+
+SQL_MAX_REPAIRS = int(os.getenv("SQL_MAX_REPAIRS", "2"))
+
+REPAIR_PROMPT = """
+You are an expert Oracle SQL assistant.
+
+The SQL below was written for the user question, but Oracle rejected it.
+
+### User Question:
+{question}
+
+### SQL:
+{sql}
+
+### Oracle Error:
+{error}
+
+Return **only the corrected Oracle SQL query**.
+- Do not include explanations.
+- Do not format the query with markdown.
+- Do not end the query with a semicolon.
+"""
+
+_FENCE_RE = re.compile(r"^```(?:sql)?\s*|\s*```$", re.IGNORECASE)
+# Leading comments and parentheses before the first keyword
+_LEADING_RE = re.compile(r"^(?:\s+|--[^\n]*(?:\n|$)|/\*.*?\*/|\()*", re.DOTALL)
+_QUERY_RE = re.compile(r"(?:SELECT|WITH)\b", re.IGNORECASE)
+
+
+def clean_sql(raw: str) -> str:
+    """Strip markdown fences and the trailing semicolon Oracle rejects."""
+    sql = _FENCE_RE.sub("", raw.strip()).strip()
+    return sql[:-1].rstrip() if sql.endswith(";") else sql
+
+
+def is_query(sql: str) -> bool:
+    return bool(_QUERY_RE.match(sql[_LEADING_RE.match(sql).end():]))
+
+
+def parse_sql(engine, sql: str) -> Optional[str]:
+    """
+    Returns None if Oracle can parse the statement, else the error text.
+    Anything but a query is rejected here and never reaches Oracle.
+    """
+    if not is_query(sql):
+        return "Only SELECT or WITH queries are allowed"
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        try:
+            cur.parse(sql)
+        finally:
+            cur.close()
+        return None
+    except Exception as e:
+        return str(e).strip()
+    finally:
+        raw.close()
+
+
+def server_timing(timings) -> str:
+    return ", ".join(f"{stage};dur={ms:.1f}" for stage, ms in timings)
+
+
+def generate_valid_sql(llm, prompt: str, question: str, engine, max_repairs: int = SQL_MAX_REPAIRS) -> Dict[str, Any]:
+    """
+    Ask the LLM for SQL and parse-check it, repairing on error.
+    Returns {"sql", "error" (None if valid), "attempts", "timings": [(stage, ms)]}.
+    LLM exceptions propagate to the caller.
+    """
+    timings = []
+
+    start = time.perf_counter()
+    sql = clean_sql(llm(prompt))
+    timings.append(("generate", (time.perf_counter() - start) * 1000))
+
+    error = None
+    for attempt in range(1, max_repairs + 2):
+        start = time.perf_counter()
+        error = parse_sql(engine, sql)
+        timings.append((f"parse{attempt}", (time.perf_counter() - start) * 1000))
+        if error is None or attempt > max_repairs:
+            return {"sql": sql, "error": error, "attempts": attempt, "timings": timings}
+
+        print(f"SQL rejected ({error}), repair attempt {attempt}")
+        start = time.perf_counter()
+        sql = clean_sql(llm(REPAIR_PROMPT.format(question=question, sql=sql, error=error)))
+        timings.append((f"repair{attempt}", (time.perf_counter() - start) * 1000))
+
+
+def generate_first_valid_sql(candidates: List[Tuple[str, Any, str]], engine) -> Dict[str, Any]:
+    """
+    Speculative generation. candidates is [(label, llm, prompt)]; all are
+    generated concurrently (token-streamed so they can be stopped), each is
+    parse-checked as soon as it completes, and the first valid one wins.
+    Remaining generations stop at their next token.
+    Returns the same dict as generate_valid_sql, plus "winner".
+    """
+    cancelled = threading.Event()
+
+    def run(label, llm, prompt):
+        timings = []
+        start = time.perf_counter()
+        text = ""
+        for chunk in llm.stream(prompt):
+            if cancelled.is_set():
+                return label, None, None, timings
+            text += chunk
+        timings.append((f"{label}-generate", (time.perf_counter() - start) * 1000))
+        sql = clean_sql(text)
+        start = time.perf_counter()
+        error = parse_sql(engine, sql)
+        timings.append((f"{label}-parse", (time.perf_counter() - start) * 1000))
+        return label, sql, error, timings
+
+    pool = ThreadPoolExecutor(max_workers=len(candidates), thread_name_prefix="sql-candidate")
+    futures = [pool.submit(run, *c) for c in candidates]
+    timings, failures = [], []
+    try:
+        for future in as_completed(futures):
+            try:
+                label, sql, error, stage_timings = future.result()
+            except Exception as e:
+                failures.append((None, str(e)))
+                continue
+            timings.extend(stage_timings)
+            if sql is None:
+                continue
+            if error is None:
+                return {"sql": sql, "error": None, "attempts": len(failures) + 1, "timings": timings,
+                        "winner": label}
+            print(f"Candidate {label} rejected: {error}")
+            failures.append((sql, error))
+    finally:
+        cancelled.set()
+        pool.shutdown(wait=False)
+
+    sql, error = failures[0] if failures else (None, "No SQL candidates generated")
+    return {"sql": sql, "error": error, "attempts": len(failures), "timings": timings, "winner": None}
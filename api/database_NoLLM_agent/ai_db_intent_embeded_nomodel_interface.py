@@ -3,9 +3,12 @@ app_oracle_ndjson_named_params.py
 
 Flask service:
 - Matches SQL templates in Oracle using embeddings
-- Allows user queries to provide parameters in {param=value} format
+- Allows user queries to provide parameters in {param=value} format or in
+  natural phrasing, via the rule-based extractor in param_extractor.py
 - Automatically maps parameters to SQL placeholders
 - Streams results in x-ndjson format
+- Optional fan-out ("fanout": true): on low-similarity matches, runs the top-N
+  runnable templates concurrently and streams rows tagged with "_template"
 
 Requirements:
 pip install flask sentence-transformers numpy oracledb
@@ -18,11 +21,16 @@ export ORACLE_DSN=host:port/service_name
 import os
 import json
 import re
-import numpy as np
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask, request, Response
 from sentence_transformers import SentenceTransformer
 import oracledb
 
+from param_extractor import ParamExtractor, load_gazetteer, parse_gazetteer_columns
+from template_store import TemplateEmbeddingStore, model_id_for
+
 ###############################################################################
 # 0) Config
 ###############################################################################
@@ -35,15 +43,85 @@ ORACLE_SERVICE  = os.environ.get("DB_SERVICE", "orcl")
 
 
 EMBEDDER_MODEL = os.environ.get("LOCAL_EMBED_MODEL", "/Users/naveengupta/veda-chatbot/api/local_all-MiniLM-L6-v2")
+TEMPLATE_SNAPSHOT_DIR = os.environ.get("TEMPLATE_SNAPSHOT_DIR", "./template_cache")
 SIMILARITY_THRESHOLD = 0.52
 DEFAULT_LIMIT = 10
 
+# Connection pool sizing
+POOL_MIN = int(os.environ.get("DB_POOL_MIN", "1"))
+POOL_MAX = int(os.environ.get("DB_POOL_MAX", "8"))
+
+# Fetch tuning; per-template values are derived from query_templates.row_hint
+DEFAULT_ARRAYSIZE = int(os.environ.get("DB_ARRAYSIZE", "500"))
+MAX_ARRAYSIZE = int(os.environ.get("DB_MAX_ARRAYSIZE", "5000"))
+
+# Fan-out mode: below SIMILARITY_THRESHOLD, run the top-N runnable candidates at once
+FANOUT_ENABLED = os.environ.get("FANOUT_ENABLED", "false").lower() == "true"
+FANOUT_TOP_N = int(os.environ.get("FANOUT_TOP_N", "3"))
+FANOUT_MIN_SIMILARITY = float(os.environ.get("FANOUT_MIN_SIMILARITY", "0.35"))
+FANOUT_ROW_CAP = int(os.environ.get("FANOUT_ROW_CAP", "1000"))
+
+# Known values for the rule-based extractor, as param=table.column pairs
+GAZETTEER_COLUMNS = parse_gazetteer_columns(os.environ.get("GAZETTEER_COLUMNS", "region=sales.region"))
+
 ###############################################################################
-# 1) Oracle connection
+# 1) Oracle connection pool
 ###############################################################################
 
+POOL = oracledb.create_pool(
+    user=ORACLE_USER,
+    password=ORACLE_PASS,
+    dsn=f"{ORACLE_HOST}:{ORACLE_PORT}/?service_name={ORACLE_SERVICE}",
+    min=POOL_MIN,
+    max=POOL_MAX,
+    increment=1,
+)
+
 def get_conn():
-    return oracledb.connect(user=ORACLE_USER, password=ORACLE_PASS, dsn=f"{ORACLE_HOST}:{ORACLE_PORT}/?service_name={ORACLE_SERVICE}")
+    return POOL.acquire()
+
+def fetch_sizes(template: dict):
+    """
+    Pick (arraysize, prefetchrows) for a template from its row-count hint.
+    Small results are fetched in the execute round trip (prefetchrows = hint + 1),
+    large ones in big batches capped at MAX_ARRAYSIZE.
+    """
+    hint = template.get("row_hint")
+    if not hint:
+        return DEFAULT_ARRAYSIZE, DEFAULT_ARRAYSIZE
+    arraysize = max(1, min(int(hint), MAX_ARRAYSIZE))
+    if hint < MAX_ARRAYSIZE:
+        return arraysize, arraysize + 1
+    return arraysize, arraysize
+
+def iter_rows(template: dict, sql: str, binds: dict, max_rows: int = None):
+    """
+    Execute on a pooled connection and yield rows as dicts, at most max_rows.
+    The with-blocks close the cursor and release the connection to the pool
+    even when the client disconnects and the generator is closed mid-stream.
+    """
+    arraysize, prefetchrows = fetch_sizes(template)
+    if max_rows:
+        arraysize = min(arraysize, max_rows)
+        prefetchrows = min(prefetchrows, max_rows + 1)
+    with POOL.acquire() as conn:
+        with conn.cursor() as cur:
+            cur.arraysize = arraysize
+            cur.prefetchrows = prefetchrows
+            cur.execute(sql, binds)
+            cols = [d[0] for d in cur.description]
+            for n, row in enumerate(cur, 1):
+                yield dict(zip(cols, row))
+                if max_rows and n >= max_rows:
+                    break
+
+def stream_rows(template: dict, sql: str, binds: dict):
+    rows = iter_rows(template, sql, binds)
+    try:
+        for row in rows:
+            yield json.dumps(row) + "\n"
+    finally:
+        rows.close()
 
 ###############################################################################
 # Load Templates + Embeddings
@@ -51,37 +129,31 @@ def get_conn():
 print("Loading embedder...")
 EMBEDDER = SentenceTransformer(EMBEDDER_MODEL)
 
+# Embeddings are tagged with the model that produced them; a model change
+# triggers a one-off batch re-embed, otherwise startup reads the local snapshot
+TEMPLATE_STORE = TemplateEmbeddingStore(get_conn, EMBEDDER, model_id_for(EMBEDDER_MODEL),
+                                        snapshot_dir=TEMPLATE_SNAPSHOT_DIR)
+
 def load_templates():
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT id, name, intent_text, sql_template, embedding FROM query_templates")
-    templates = []
-    for row in cur:
-        id_, name, intent_text, sql_template, embedding_blob = row
-        
-        # Convert CLOB -> str
-        sql_text = sql_template.read() if hasattr(sql_template, "read") else sql_template
-
-        # Convert BLOB -> numpy array
-        emb = None
-        if embedding_blob is not None:
-            emb_bytes = embedding_blob.read()
-            emb = np.frombuffer(emb_bytes, dtype=np.float32)
-
-        templates.append({
-            "id": id_,
-            "name": name,
-            "intent_text": intent_text,
-            "sql": sql_text,   # use str, not LOB
-            "embedding": emb
-        })
-
-    cur.close()
-    conn.close()
-    return templates
-
-TEMPLATES = load_templates()
-TEMPLATE_EMBS = np.array([t["embedding"] for t in TEMPLATES])
+    return TEMPLATE_STORE.load()
+
+TEMPLATES, TEMPLATE_EMBS = load_templates()
+
+def build_param_extractor(templates):
+    names = {ph.lower() for t in templates for ph in re.findall(r"\{(.*?)\}", t["sql"])}
+    gazetteer = {}
+    if GAZETTEER_COLUMNS:
+        try:
+            conn = get_conn()
+            try:
+                gazetteer = load_gazetteer(conn, GAZETTEER_COLUMNS)
+            finally:
+                conn.close()
+        except Exception as e:
+            print("gazetteer load failed:", e)
+    return ParamExtractor(names, gazetteer=gazetteer)
+
+PARAM_EXTRACTOR = build_param_extractor(TEMPLATES)
 
 def retrieve_best_template(query: str):
     q_emb = EMBEDDER.encode([query], normalize_embeddings=True)[0]
@@ -95,31 +167,17 @@ def retrieve_best_template(query: str):
 ###############################################################################
 def extract_named_parameters(user_query: str) -> dict:
     """
-    Extract parameters in the format {param=value} from user query.
+    Extract parameters from the user query: explicit {param=value} pairs plus
+    natural phrasing ("top 5", "last year", "in North America", "over 10k").
     Returns a dict of param_name -> value
     """
-    params = {}
-    matches = re.findall(r"\{(.*?)=(.*?)\}", user_query)
-    for name, value in matches:
-        name = name.strip()
-        value = value.strip()
-        # Convert numeric if possible
-        if value.isdigit():
-            value = int(value)
-        else:
-            try:
-                value = float(value)
-            except ValueError:
-                pass
-        params[name] = value
-    return params
-
-import re
+    return PARAM_EXTRACTOR.extract(user_query)
 
 def inject_named_parameters(sql_template: str, param_dict: dict) -> str:
     """
     Replace {param_name} in SQL template with :param_name bind variables.
-    Case-insensitive for parameter names.
+    Case-insensitive for parameter names. Only the referenced parameters are
+    returned as binds, since Oracle rejects unused bind names.
     """
     new_sql = sql_template
 
@@ -128,6 +186,7 @@ def inject_named_parameters(sql_template: str, param_dict: dict) -> str:
 
     # Find all placeholders like {param}
     placeholders = re.findall(r"\{(.*?)\}", sql_template)
+    binds = {}
 
     for ph in placeholders:
         key = ph.lower()
@@ -135,8 +194,68 @@ def inject_named_parameters(sql_template: str, param_dict: dict) -> str:
             raise ValueError(f"Missing value for parameter: {ph}")
         # Replace exactly as it appears in the template with the bind variable
         new_sql = new_sql.replace(f"{{{ph}}}", f":{key}")
+        binds[key] = lower_param_dict[key]
+
+    return new_sql, binds
+
+
+###############################################################################
+# Multi-template fan-out
+###############################################################################
+FANOUT_EXECUTOR = ThreadPoolExecutor(max_workers=POOL_MAX, thread_name_prefix="fanout")
+_FANOUT_DONE = object()
 
-    return new_sql, lower_param_dict
+def fanout_candidates(ranked, param_dict: dict) -> list:
+    """
+    Top-N templates above FANOUT_MIN_SIMILARITY whose placeholders are all
+    satisfied by param_dict. Returns [(template, sql, binds)].
+    """
+    candidates = []
+    for i, s in ranked[:FANOUT_TOP_N]:
+        if s < FANOUT_MIN_SIMILARITY:
+            break
+        try:
+            sql, binds = inject_named_parameters(TEMPLATES[i]["sql"], param_dict)
+        except ValueError:
+            continue
+        candidates.append((TEMPLATES[i], sql, binds))
+    return candidates
+
+def stream_fanout(candidates: list):
+    """
+    Run the candidates concurrently on pooled connections and yield their rows
+    interleaved as they arrive, each tagged with "_template".
+    """
+    out = queue.Queue()
+    cancelled = threading.Event()
+
+    def worker(template, sql, binds):
+        rows = iter_rows(template, sql, binds, max_rows=FANOUT_ROW_CAP)
+        try:
+            for row in rows:
+                if cancelled.is_set():
+                    break
+                out.put(json.dumps({"_template": template["name"], **row}) + "\n")
+        except Exception as e:
+            out.put(json.dumps({"_template": template["name"], "error": str(e)}) + "\n")
+        finally:
+            rows.close()
+            out.put(_FANOUT_DONE)
+
+    for candidate in candidates:
+        FANOUT_EXECUTOR.submit(worker, *candidate)
+
+    try:
+        pending = len(candidates)
+        while pending:
+            item = out.get()
+            if item is _FANOUT_DONE:
+                pending -= 1
+                continue
+            yield item
+    finally:
+        # Client went away or we are done: workers stop at their next row
+        cancelled.set()
 
 
 ###############################################################################
@@ -152,6 +271,13 @@ def query():
                         mimetype="application/x-ndjson")
 
     template, sim, ranked = retrieve_best_template(user_query)
+
+    # Opt-in: answer ambiguous questions by running several candidates at once
+    if sim < SIMILARITY_THRESHOLD and request.json.get("fanout", FANOUT_ENABLED):
+        candidates = fanout_candidates(ranked, extract_named_parameters(user_query))
+        if candidates:
+            return Response(stream_fanout(candidates), mimetype="application/x-ndjson")
+
     #Fallback message - user can use it like help or ?
     if sim < SIMILARITY_THRESHOLD:
         suggestions = [TEMPLATES[i]["intent_text"] for i, _ in ranked[:3]]
@@ -179,25 +305,7 @@ def query():
         return Response(json.dumps({"matched": False, "error": str(e)}) + "\n",
                         mimetype="application/x-ndjson")
 
-    def generate():
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute(new_sql, param_dict)
-        cols = [d[0] for d in cur.description]
-        # meta = {
-        #     "matched": True,
-        #     "similarity": round(sim,3),
-        #     "template": template["name"],
-        #     "params": param_dict,
-        #     "columns": cols
-        # }
-        # yield json.dumps(meta) + "\n"
-        for row in cur:
-            yield json.dumps(dict(zip(cols, row))) + "\n"
-        cur.close()
-        conn.close()
-
-    return Response(generate(), mimetype="application/x-ndjson")
+    return Response(stream_rows(template, new_sql, param_dict), mimetype="application/x-ndjson")
 
 ###############################################################################
 # Run App
@@ -4,7 +4,7 @@ app_oracle.py
 Flask service that:
 - Embeds NL queries with all-MiniLM-L6-v2
 - Retrieves closest SQL template (semantic similarity)
-- Extracts parameters (regex & rules)
+- Extracts parameters (precompiled rules + gazetteer, see param_extractor.py)
 - Executes queries on an Oracle DB
 - Returns results as x-ndjson stream
 
@@ -27,9 +27,7 @@ Query:
 """
 
 import os
-import re
 import json
-import datetime as dt
 from typing import Dict, Any, List, Tuple
 
 import numpy as np
@@ -37,6 +35,8 @@ from flask import Flask, request, Response, jsonify
 from sentence_transformers import SentenceTransformer
 import oracledb
 
+from param_extractor import ParamExtractor, load_gazetteer, parse_gazetteer_columns
+
 ###############################################################################
 # 0) Config
 ###############################################################################
@@ -52,6 +52,9 @@ EMBEDDER_MODEL = os.environ.get("LOCAL_EMBED_MODEL", "/Users/naveengupta/veda-ch
 SIMILARITY_THRESHOLD = 0.52
 DEFAULT_LIMIT = 10
 
+# Known values for the rule-based extractor, as param=table.column pairs
+GAZETTEER_COLUMNS = parse_gazetteer_columns(os.environ.get("GAZETTEER_COLUMNS", "region=sales.region"))
+
 ###############################################################################
 # 1) Oracle connection
 ###############################################################################
@@ -142,45 +145,31 @@ def retrieve_best_template(query: str):
 # 4) Param extraction
 ###############################################################################
 
-YEAR_RE = re.compile(r"\b(20\d{2})\b")
-TOP_N_RE = re.compile(r"\btop\s+(\d+)", re.IGNORECASE)
-DATE_RE = re.compile(r"\b(20\d{2}-\d{2}-\d{2})\b")
-BETWEEN_RE = re.compile(
-    r"(?:between|from)\s+(20\d{2}-\d{2}-\d{2})\s+(?:and|to)\s+(20\d{2}-\d{2}-\d{2})",
-    re.IGNORECASE
-)
+def build_param_extractor(templates: List[Dict[str, Any]]) -> ParamExtractor:
+    names = {p for t in templates for p in t["required"] + t.get("optional", [])}
+    gazetteer = {}
+    if GAZETTEER_COLUMNS:
+        try:
+            conn = get_conn()
+            try:
+                gazetteer = load_gazetteer(conn, GAZETTEER_COLUMNS)
+            finally:
+                conn.close()
+        except Exception as e:
+            print("gazetteer load failed:", e)
+    return ParamExtractor(names, gazetteer=gazetteer)
+
+# Compiled once for the template set: one alternation regex + gazetteer trie
+PARAM_EXTRACTOR = build_param_extractor(TEMPLATES)
 
 def extract_params(query: str) -> Dict[str, Any]:
-    q = query.lower()
-    today = dt.date.today()
-    params = {}
-
-    if "last year" in q:
-        params["year"] = str(today.year - 1)
-    elif "this year" in q:
-        params["year"] = str(today.year)
-
-    my = YEAR_RE.search(q)
-    if my:
-        params["year"] = my.group(1)
-
-    mtop = TOP_N_RE.search(q)
-    if mtop:
-        params["limit"] = int(mtop.group(1))
-
-    mbetween = BETWEEN_RE.search(q)
-    if mbetween:
-        params["start_date"], params["end_date"] = mbetween.groups()
-
-    mdate = DATE_RE.search(q)
-    if mdate:
-        params["date"] = mdate.group(1)
-
-    return params
+    return PARAM_EXTRACTOR.extract(query)
 
 def validate_and_fill(template, params):
     missing = [p for p in template["required"] if p not in params]
-    filled = dict(params)
+    # Only the template's own binds; Oracle rejects unused bind names
+    wanted = set(template["required"]) | set(template.get("optional", []))
+    filled = {k: v for k, v in params.items() if k in wanted}
     for k, v in template.get("defaults", {}).items():
         filled.setdefault(k, v)
     return len(missing) == 0, missing, filled
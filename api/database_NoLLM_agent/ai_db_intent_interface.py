@@ -1,6 +1,7 @@
-from flask import Flask, request, jsonify, Response, stream_with_context
+from flask import Flask, request, jsonify, Response, stream_with_context, send_file
 from dotenv import load_dotenv
 import os
+import sys
 import time
 import diskcache
 from sqlalchemy import create_engine, text
@@ -11,6 +12,10 @@ import datetime
 
 import decimal  # ✅ Added to handle Decimal types
 
+# Shared modules live with the LLM agents
+sys.path.append(os.getenv("SHARED_MODULES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "../database_LLM_agent")))
+from ndjson_cache import write_through_cache, get_cached_file
+
 
 # Load .env credentials
 load_dotenv()
@@ -19,7 +24,11 @@ app = Flask(__name__)
 
 # Cache setup (30 min)
 CACHE_EXPIRATION_SECONDS = 1800
-cache = diskcache.Cache("./llm_cache")
+# Result sets bigger than this are streamed but never cached
+CACHE_MAX_ENTRY_BYTES = int(os.getenv("CACHE_MAX_ENTRY_BYTES", str(50 * 1024 * 1024)))
+# Total on-disk budget; diskcache evicts least recently stored entries beyond it
+CACHE_SIZE_LIMIT_BYTES = int(os.getenv("CACHE_SIZE_LIMIT_BYTES", str(1024 * 1024 * 1024)))
+cache = diskcache.Cache("./llm_cache", size_limit=CACHE_SIZE_LIMIT_BYTES)
 
 # DB setup
 db_uri = f"oracle+oracledb://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT', '1521')}/?service_name={os.getenv('DB_SERVICE')}"
@@ -89,11 +98,15 @@ def query_db():
     if not is_safe_sql(sql):
         return jsonify({"error": "Unsafe SQL detected."}), 403
 
-    # # Cache check by intent + model
-    # cache_key = f"{model}:{intent}"
-    # cached = cache.get(cache_key)
-    # if cached:
-    #     return jsonify({"response": cached, "cached": True})
+    # Cache check by intent (results do not depend on the model)
+    cache_key = f"intent:{intent}"
+    cached = get_cached_file(cache, cache_key)
+    if cached is not None:
+        log_query(intent, sql + " (cached)", user_agent, client_ip, model)
+        # File handle straight from the cache directory, served via wsgi.file_wrapper
+        response = send_file(cached, mimetype='application/x-ndjson')
+        response.headers["X-Cache"] = "HIT"
+        return response
 
     try:
 
@@ -105,20 +118,16 @@ def query_db():
                 for row in result:
                     row_dict = serialize_row(row, columns)
                     yield json.dumps(row_dict) + "\n"
-                    
-
-
-        # Cache the full SQL result as text (optional: cache partial or JSON)
-        # To cache the streamed result fully, we need to collect it first (here simplified)
-        # with engine.connect() as conn:
-        #     res = conn.execute(text(sql))
-        #     all_rows = [dict(zip(res.keys(), row)) for row in res]
 
-        #cache.set(cache_key, all_rows, expire=CACHE_EXPIRATION_SECONDS)
         log_query(intent, sql, user_agent, client_ip, model)
 
-        # Return streamed CSV response
-        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        # Stream rows to the client and write them through to the cache
+        response = Response(stream_with_context(write_through_cache(cache, cache_key, generate(),
+                                                                     expire=CACHE_EXPIRATION_SECONDS,
+                                                                     max_bytes=CACHE_MAX_ENTRY_BYTES)),
+                            mimetype='application/x-ndjson')
+        response.headers["X-Cache"] = "MISS"
+        return response
 
     except Exception as e:
         log_query(intent, str(e), user_agent, client_ip, model)
@@ -3,12 +3,16 @@ import numpy as np
 import json
 from sentence_transformers import SentenceTransformer
 
+from template_store import encode_embedding, model_id_for
+
 # Oracle connection
 conn = oracledb.connect(user="riskintegov2", password="riskintegov2", dsn="localhost:1521/riskintegov2")
 cur = conn.cursor()
 
 # Load embedder
-model = SentenceTransformer("/Users/naveengupta/veda-chatbot/api/local_all-MiniLM-L6-v2")
+MODEL_PATH = "/Users/naveengupta/veda-chatbot/api/local_all-MiniLM-L6-v2"
+model = SentenceTransformer(MODEL_PATH)
+MODEL_ID = model_id_for(MODEL_PATH)
 
 # Example templates
 templates = [
@@ -16,28 +20,36 @@ templates = [
         "name": "sales_by_region_year",
         "intent_text": "Get sales for a specific region and year with minimum revenue",
         "sql": "SELECT * FROM sales WHERE region={region} AND to_char(date, 'YYYY')={year} AND total_amount >= {min_revenue}",
+        "row_hint": 5000
     },
     {
         "name": "top_customers",
         "intent_text": "Top N customers by total revenue in a given year",
-        "sql": "SELECT * FROM (SELECT customer_id, SUM(total_amount) total_revenue FROM sales WHERE to_char(sale_date, 'YYYY')={year} GROUP BY customer_id ORDER BY total_revenue DESC) WHERE ROWNUM <= {limit}"
+        "sql": "SELECT * FROM (SELECT customer_id, SUM(total_amount) total_revenue FROM sales WHERE to_char(sale_date, 'YYYY')={year} GROUP BY customer_id ORDER BY total_revenue DESC) WHERE ROWNUM <= {limit}",
+        "row_hint": 10
     }
 ]
 
 for t in templates:
     emb = model.encode([t["intent_text"]], normalize_embeddings=True)[0].astype(np.float32)
-    emb_blob = emb.tobytes()
+    emb_blob = encode_embedding(emb)
     # Parameters can be empty or optional
     params_json = None
     cur.execute("""
-        INSERT INTO query_templates (name, intent_text, sql_template, embedding, parameters)
-        VALUES (:name, :intent_text, :sql_template, :embedding, :parameters)
+        INSERT INTO query_templates (name, intent_text, sql_template, embedding, parameters, row_hint,
+                                     embedding_model, embedding_dim, embedding_norm)
+        VALUES (:name, :intent_text, :sql_template, :embedding, :parameters, :row_hint,
+                :embedding_model, :embedding_dim, :embedding_norm)
     """, {
         "name": t["name"],
         "intent_text": t["intent_text"],
         "sql_template": t["sql"],
         "embedding": emb_blob,
-        "parameters": params_json
+        "parameters": params_json,
+        "row_hint": t.get("row_hint"),
+        "embedding_model": MODEL_ID,
+        "embedding_dim": int(emb.size),
+        "embedding_norm": float(np.linalg.norm(emb))
     })
 
 conn.commit()
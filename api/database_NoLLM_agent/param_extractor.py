@@ -0,0 +1,274 @@
+"""
+param_extractor.py
+
+Rule-based parameter extraction for the NoLLM template services:
+- Built once per template set from the parameter names the templates use
+- All patterns compiled into a single alternation, scanned with one finditer pass
+- Gazetteer of known column values (e.g. regions in SALES) matched via a token trie
+- Parses ISO / day-first / month-name dates, relative periods and numbers (1,200 / 5k)
+- Still honours explicit {param=value} syntax, which always wins
+
+No model calls; extraction of a typical prompt takes well under a millisecond.
+"""
+
+import re
+import calendar
+import datetime as dt
+from typing import Dict, Any, List, Iterable, Optional, Tuple, Union
+
+MONTHS = {m.lower(): i for i, m in enumerate(calendar.month_name) if m}
+MONTHS.update({m.lower(): i for i, m in enumerate(calendar.month_abbr) if m})
+MONTHS["sept"] = 9
+
+_MONTH = r"(?:" + "|".join(sorted(MONTHS, key=len, reverse=True)) + r")\.?"
+_ISO_DATE = r"(?:19|20)\d{2}-\d{1,2}-\d{1,2}"
+_NUM_DATE = r"\d{1,2}[/.]\d{1,2}[/.](?:19|20)\d{2}"
+_NAMED_DATE = (rf"\d{{1,2}}(?:st|nd|rd|th)?\s+{_MONTH},?\s+(?:19|20)\d{{2}}"
+               rf"|{_MONTH}\s+\d{{1,2}}(?:st|nd|rd|th)?,?\s+(?:19|20)\d{{2}}")
+_DATE = rf"(?:{_ISO_DATE}|{_NUM_DATE}|{_NAMED_DATE})"
+_NUMBER = r"\d[\d,]*(?:\.\d+)?(?:\s*(?:k|m|bn|thousand|million|billion)\b)?"
+
+_SCALE = {"k": 1e3, "thousand": 1e3, "m": 1e6, "million": 1e6, "bn": 1e9, "billion": 1e9}
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def parse_number(text: str):
+    """'1,200' -> 1200, '2.5k' -> 2500, '3.75' -> 3.75"""
+    m = re.match(r"([\d,]*\.?\d+)\s*([a-z]*)", text.strip().lower())
+    if not m:
+        return None
+    value = float(m.group(1).replace(",", ""))
+    value *= _SCALE.get(m.group(2), 1)
+    return int(value) if value.is_integer() else value
+
+
+def parse_date(text: str, dayfirst: bool = True) -> Optional[str]:
+    """Normalise a matched date to 'YYYY-MM-DD' (the format the templates TO_DATE with)."""
+    text = text.strip().lower().replace(",", "")
+    try:
+        if re.fullmatch(_ISO_DATE, text):
+            y, mth, d = (int(p) for p in text.split("-"))
+        elif re.fullmatch(_NUM_DATE, text):
+            a, b, y = (int(p) for p in re.split(r"[/.]", text))
+            d, mth = (a, b) if dayfirst else (b, a)
+        else:
+            parts = [re.sub(r"(st|nd|rd|th|\.)$", "", p) for p in text.split()]
+            if parts[0].isdigit():
+                d, mth, y = int(parts[0]), MONTHS[parts[1]], int(parts[2])
+            else:
+                mth, d, y = MONTHS[parts[0]], int(parts[1]), int(parts[2])
+        return dt.date(y, mth, d).isoformat()
+    except (ValueError, KeyError, IndexError):
+        return None
+
+
+def _coerce(value: str):
+    value = value.strip().strip("'\"")
+    if value.isdigit():
+        return int(value)
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+class GazetteerTrie:
+    """
+    Word-level trie over known values, e.g. {"region": ["North America", "EMEA"]}.
+    match() returns the longest known value at each position, left to right.
+    """
+
+    _END = object()
+
+    def __init__(self, values: Dict[str, Iterable[str]] = None):
+        self.root: Dict[Any, Any] = {}
+        for param, items in (values or {}).items():
+            for value in items:
+                self.add(param, value)
+
+    def add(self, param: str, value: str):
+        tokens = _TOKEN_RE.findall(str(value).lower())
+        if not tokens:
+            return
+        node = self.root
+        for tok in tokens:
+            node = node.setdefault(tok, {})
+        node[self._END] = (param, value)
+
+    def match(self, text: str) -> List[Tuple[str, Any]]:
+        tokens = _TOKEN_RE.findall(text.lower())
+        found = []
+        i = 0
+        while i < len(tokens):
+            node, best, j = self.root, None, i
+            while j < len(tokens) and tokens[j] in node:
+                node = node[tokens[j]]
+                j += 1
+                if self._END in node:
+                    best = (node[self._END], j)
+            if best:
+                found.append(best[0])
+                i = best[1]
+            else:
+                i += 1
+        return found
+
+
+class ParamExtractor:
+    """
+    Extractor compiled for a fixed set of template parameter names.
+
+    Canonical slots produced by the built-in rules: year, date, start_date,
+    end_date, limit, and min_*/max_* for comparative phrases ("over 10k").
+    Any other parameter name is matched by keyword ("customer id 42",
+    "min revenue = 5000") or by the gazetteer (a dict of values, or a
+    GazetteerTrie shared between extractors).
+    """
+
+    def __init__(self, param_names: Iterable[str], gazetteer: Union[Dict[str, Iterable[str]], GazetteerTrie] = None,
+                 dayfirst: bool = True):
+        self.param_names = sorted({p.lower() for p in param_names})
+        self.dayfirst = dayfirst
+        # A prebuilt trie can be shared by many extractors
+        self.gazetteer = gazetteer if isinstance(gazetteer, GazetteerTrie) else GazetteerTrie(gazetteer)
+        self._kw_params: List[str] = []
+
+        alternatives = [
+            r"(?P<explicit>\{\s*(?P<explicit_name>[^{}=]+?)\s*=\s*(?P<explicit_value>[^{}]*?)\s*\})",
+            rf"(?P<between>\b(?:between|from)\s+(?P<between_start>{_DATE})\s+(?:and|to|until|-)\s+(?P<between_end>{_DATE}))",
+            rf"(?P<date>\b{_DATE}\b)",
+            rf"(?P<month_year>\b(?P<month_year_month>{_MONTH})\s+(?P<month_year_year>(?:19|20)\d{{2}})\b)",
+            r"(?P<last_days>\b(?:last|past|previous)\s+(?P<last_days_n>\d+)\s+days?\b)",
+            r"(?P<relative>\b(?:(?P<relative_which>this|last|previous|current)\s+(?P<relative_unit>year|month)|today|yesterday)\b)",
+            r"(?P<top>\b(?:top|first|limit|bottom)\s+(?P<top_n>\d+)\b)",
+            rf"(?P<compare>(?P<compare_op>\b(?:over|above|more than|greater than|at least|exceeding|under|below|less than|at most)\b|>=|<=|>|<)\s*\$?(?P<compare_value>{_NUMBER}))",
+        ]
+        # One keyword alternative per template parameter that has no built-in rule
+        for name in self.param_names:
+            if name in ("year", "date", "start_date", "end_date", "limit"):
+                continue
+            words = name.split("_")
+            if words[-1] == "id" and len(words) > 1:
+                key = r"[\s_]*".join(map(re.escape, words[:-1])) + r"(?:[\s_]*id)?"
+            else:
+                key = r"[\s_]*".join(map(re.escape, words))
+            group = f"kw{len(self._kw_params)}"
+            self._kw_params.append(name)
+            alternatives.append(
+                rf"(?P<{group}>\b{key}\s*(?:=|:|is|of|#)?\s*"
+                rf"(?P<{group}_value>'[^']*'|\"[^\"]*\"|{_DATE}|{_NUMBER}))"
+            )
+        alternatives.append(r"(?P<year>\b(?:19|20)\d{2}\b)")
+
+        self.pattern = re.compile("|".join(alternatives), re.IGNORECASE)
+
+    def extract(self, text: str, today: dt.date = None) -> Dict[str, Any]:
+        today = today or dt.date.today()
+        params: Dict[str, Any] = {}
+        explicit: Dict[str, Any] = {}
+
+        for m in self.pattern.finditer(text):
+            kind = m.lastgroup
+            if kind == "explicit":
+                explicit[m.group("explicit_name").strip().lower()] = _coerce(m.group("explicit_value"))
+            elif kind == "between":
+                start = parse_date(m.group("between_start"), self.dayfirst)
+                end = parse_date(m.group("between_end"), self.dayfirst)
+                if start and end:
+                    params["start_date"], params["end_date"] = start, end
+            elif kind == "date":
+                d = parse_date(m.group("date"), self.dayfirst)
+                if d:
+                    params.setdefault("date", d)
+                    params.setdefault("year", d[:4])
+            elif kind == "month_year":
+                month = MONTHS[m.group("month_year_month").lower().rstrip(".")]
+                year = int(m.group("month_year_year"))
+                params["year"] = str(year)
+                params.setdefault("start_date", dt.date(year, month, 1).isoformat())
+                params.setdefault("end_date", dt.date(year, month, calendar.monthrange(year, month)[1]).isoformat())
+            elif kind == "last_days":
+                params["start_date"] = (today - dt.timedelta(days=int(m.group("last_days_n")))).isoformat()
+                params["end_date"] = today.isoformat()
+            elif kind == "relative":
+                self._relative(m, today, params)
+            elif kind == "top":
+                params["limit"] = int(m.group("top_n"))
+            elif kind == "compare":
+                op = m.group("compare_op").lower()
+                slot = "max" if op in ("under", "below", "less than", "at most", "<", "<=") else "min"
+                params.setdefault(f"{slot}_value", parse_number(m.group("compare_value")))
+            elif kind == "year":
+                params.setdefault("year", m.group("year"))
+            elif kind and kind.startswith("kw"):
+                name = self._kw_params[int(kind[2:])]
+                raw = m.group(f"{kind}_value")
+                d = parse_date(raw, self.dayfirst) if re.fullmatch(_DATE, raw.strip(), re.IGNORECASE) else None
+                params[name] = d or (_coerce(raw) if raw[:1] in "'\"" else parse_number(raw))
+
+        for name, value in self.gazetteer.match(text):
+            params.setdefault(name, value)
+
+        # Spread comparative values onto the template's own min_*/max_* names
+        for slot in ("min", "max"):
+            value = params.pop(f"{slot}_value", None)
+            if value is None:
+                continue
+            for name in self.param_names:
+                if name.startswith(f"{slot}_"):
+                    params.setdefault(name, value)
+
+        params.update(explicit)
+        return params
+
+    @staticmethod
+    def _relative(m, today: dt.date, params: Dict[str, Any]):
+        phrase = m.group("relative").lower()
+        if phrase == "today":
+            params.setdefault("date", today.isoformat())
+            return
+        if phrase == "yesterday":
+            params.setdefault("date", (today - dt.timedelta(days=1)).isoformat())
+            return
+        previous = m.group("relative_which").lower() in ("last", "previous")
+        if m.group("relative_unit").lower() == "year":
+            params["year"] = str(today.year - 1 if previous else today.year)
+            return
+        first = today.replace(day=1)
+        if previous:
+            first = (first - dt.timedelta(days=1)).replace(day=1)
+        last_day = calendar.monthrange(first.year, first.month)[1]
+        params.setdefault("start_date", first.isoformat())
+        params.setdefault("end_date", first.replace(day=last_day).isoformat())
+        params.setdefault("year", str(first.year))
+
+
+def load_gazetteer(conn, columns: Dict[str, str], max_values: int = 5000) -> Dict[str, List[str]]:
+    """
+    Distinct values per parameter from the database.
+    columns maps parameter name -> "table.column", e.g. {"region": "sales.region"}.
+    """
+    gazetteer: Dict[str, List[str]] = {}
+    cur = conn.cursor()
+    try:
+        for param, target in columns.items():
+            table, column = target.split(".", 1)
+            if not (re.fullmatch(r"[\w$#]+", table) and re.fullmatch(r"[\w$#]+", column)):
+                raise ValueError(f"Invalid gazetteer column: {target}")
+            cur.execute(
+                f"SELECT DISTINCT {column} FROM {table} WHERE {column} IS NOT NULL FETCH FIRST :n ROWS ONLY",
+                {"n": max_values},
+            )
+            gazetteer[param] = [row[0] for row in cur if isinstance(row[0], str)]
+    finally:
+        cur.close()
+    return gazetteer
+
+
+def parse_gazetteer_columns(spec: str) -> Dict[str, str]:
+    """'region=sales.region,product=products.name' -> {"region": "sales.region", ...}"""
+    columns = {}
+    for item in filter(None, (s.strip() for s in (spec or "").split(","))):
+        param, _, target = item.partition("=")
+        columns[param.strip().lower()] = target.strip()
+    return columns
@@ -0,0 +1,192 @@
+"""
+template_store.py
+
+Template-embedding store for the query_templates table:
+- Every embedding is tagged with the model id, dimension and norm that produced it
+- BLOB/CLOB columns are fetched inline in one batch (no per-row LOB round trips)
+- A local snapshot (metadata JSON + .npy matrix, memory-mapped on load) makes
+  startup a single fingerprint query when nothing changed
+- Rows embedded by a different model (or not at all) are re-embedded in one
+  batch and written back, so switching LOCAL_EMBED_MODEL needs no manual step
+"""
+
+import os
+import sys
+import json
+from typing import Dict, Any, List, Tuple
+
+import numpy as np
+import oracledb
+
+# Shared modules live with the LLM agents
+sys.path.append(os.getenv("SHARED_MODULES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "../database_LLM_agent")))
+from embedding_codec import model_id_for
+
+SNAPSHOT_META = "templates.json"
+SNAPSHOT_EMBS = "template_embeddings.npy"
+
+
+def encode_embedding(vec: np.ndarray) -> bytes:
+    """float32 little-endian bytes, the format stored in query_templates.embedding"""
+    return np.asarray(vec, dtype="<f4").tobytes()
+
+
+def _inline_lob_handler(cursor, name, default_type, size, precision, scale):
+    # Fetch LOBs as bytes/str together with the row instead of as LOB locators
+    if default_type == oracledb.DB_TYPE_BLOB:
+        return cursor.var(oracledb.DB_TYPE_LONG_RAW, arraysize=cursor.arraysize)
+    if default_type == oracledb.DB_TYPE_CLOB:
+        return cursor.var(oracledb.DB_TYPE_LONG, arraysize=cursor.arraysize)
+
+
+class TemplateEmbeddingStore:
+
+    def __init__(self, get_conn, embedder, model_id: str, snapshot_dir: str = "./template_cache"):
+        self.get_conn = get_conn
+        self.embedder = embedder
+        self.model_id = model_id
+        self.snapshot_dir = snapshot_dir
+
+    # -------------------------------------------------------------------------
+    # Public
+    # -------------------------------------------------------------------------
+    def load(self) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+        """
+        Returns (templates, embedding matrix). Matrix rows are L2-normalised
+        float32 and line up with the templates list.
+        """
+        conn = self.get_conn()
+        try:
+            fingerprint = self._fingerprint(conn)
+            snapshot = self._read_snapshot(fingerprint)
+            if snapshot is not None:
+                return snapshot
+
+            templates, embs = self._fetch(conn)
+            embs = self._reembed_stale(conn, templates, embs)
+        finally:
+            conn.close()
+
+        # Re-embedding writes back to the table, so take the fingerprint again
+        conn = self.get_conn()
+        try:
+            fingerprint = self._fingerprint(conn)
+        finally:
+            conn.close()
+        self._write_snapshot(fingerprint, templates, embs)
+        return templates, embs
+
+    # -------------------------------------------------------------------------
+    # Database
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _fingerprint(conn) -> List[int]:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT COUNT(*), NVL(MAX(ORA_ROWSCN), 0) FROM query_templates")
+            count, scn = cur.fetchone()
+            return [int(count), int(scn)]
+        finally:
+            cur.close()
+
+    def _fetch(self, conn) -> Tuple[List[Dict[str, Any]], List[Any]]:
+        cur = conn.cursor()
+        try:
+            cur.outputtypehandler = _inline_lob_handler
+            cur.arraysize = 1000
+            cur.execute("""
+                SELECT id, name, intent_text, sql_template, embedding, row_hint,
+                       embedding_model, embedding_dim
+                FROM query_templates
+                ORDER BY id
+            """)
+            rows = cur.fetchall()
+        finally:
+            cur.close()
+
+        templates, embs = [], []
+        for id_, name, intent_text, sql_text, emb_bytes, row_hint, emb_model, emb_dim in rows:
+            emb = None
+            if emb_bytes and emb_model == self.model_id:
+                emb = np.frombuffer(emb_bytes, dtype="<f4")
+                if emb_dim and emb.size != int(emb_dim):
+                    emb = None
+            templates.append({
+                "id": id_,
+                "name": name,
+                "intent_text": intent_text,
+                "sql": sql_text,
+                "row_hint": int(row_hint) if row_hint else None,
+            })
+            embs.append(emb)
+        return templates, embs
+
+    def _reembed_stale(self, conn, templates, embs) -> np.ndarray:
+        stale = [i for i, e in enumerate(embs) if e is None]
+        if stale:
+            print(f"Re-embedding {len(stale)} template(s) with {self.model_id}")
+            fresh = self.embedder.encode(
+                [templates[i]["intent_text"] for i in stale],
+                normalize_embeddings=True,
+                batch_size=64,
+            ).astype(np.float32)
+            for i, vec in zip(stale, fresh):
+                embs[i] = vec
+            cur = conn.cursor()
+            try:
+                cur.setinputsizes(embedding=oracledb.DB_TYPE_BLOB)
+                cur.executemany("""
+                    UPDATE query_templates
+                    SET embedding = :embedding, embedding_model = :model,
+                        embedding_dim = :dim, embedding_norm = :norm
+                    WHERE id = :id
+                """, [{
+                    "embedding": encode_embedding(vec),
+                    "model": self.model_id,
+                    "dim": int(vec.size),
+                    "norm": float(np.linalg.norm(vec)),
+                    "id": templates[i]["id"],
+                } for i, vec in zip(stale, fresh)])
+                conn.commit()
+            finally:
+                cur.close()
+
+        if not embs:
+            return np.zeros((0, 0), dtype=np.float32)
+        matrix = np.vstack(embs).astype(np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+    # -------------------------------------------------------------------------
+    # Local snapshot
+    # -------------------------------------------------------------------------
+    def _read_snapshot(self, fingerprint):
+        meta_path = os.path.join(self.snapshot_dir, SNAPSHOT_META)
+        embs_path = os.path.join(self.snapshot_dir, SNAPSHOT_EMBS)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta["model_id"] != self.model_id or meta["fingerprint"] != fingerprint:
+                return None
+            embs = np.load(embs_path, mmap_mode="r")
+        except (OSError, ValueError, KeyError):
+            return None
+        if embs.shape[0] != len(meta["templates"]):
+            return None
+        return meta["templates"], embs
+
+    def _write_snapshot(self, fingerprint, templates, embs: np.ndarray):
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        meta_path = os.path.join(self.snapshot_dir, SNAPSHOT_META)
+        embs_path = os.path.join(self.snapshot_dir, SNAPSHOT_EMBS)
+        # Write to temp files and rename so a crash never leaves a half snapshot
+        np.save(embs_path + ".tmp.npy", embs)
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump({
+                "model_id": self.model_id,
+                "dim": int(embs.shape[1]) if embs.ndim == 2 else 0,
+                "fingerprint": fingerprint,
+                "templates": templates,
+            }, f)
+        os.replace(embs_path + ".tmp.npy", embs_path)
+        os.replace(meta_path + ".tmp", meta_path)
@@ -167,6 +167,16 @@ CREATE TABLE DOCUMENT_EMBEDDINGS (
     text_content CLOB NOT NULL
 );
 
+-- Crawl state per page, used by /ingest for conditional GET and change detection
+CREATE TABLE WEB_PAGES (
+    url VARCHAR2(2000) PRIMARY KEY,
+    etag VARCHAR2(500),
+    last_modified VARCHAR2(100),
+    content_hash VARCHAR2(64),
+    chunk_count NUMBER,
+    fetched_at TIMESTAMP
+);
+
 CREATE TABLE RISK_METADATA (
   column_name VARCHAR2(100),
   data_type VARCHAR2(50),
@@ -191,3 +201,8 @@ CREATE TABLE query_templates (
     parameters CLOB                      -- JSON array of parameter definitions (optional)
 );
 
+-- Expected number of result rows per template; sizes the fetch arraysize/prefetchrows
+ALTER TABLE query_templates ADD (row_hint NUMBER);
+
+-- Which model produced each template embedding; rows from another model are re-embedded on load
+ALTER TABLE query_templates ADD (embedding_model VARCHAR2(400), embedding_dim NUMBER, embedding_norm NUMBER);
@@ -1,10 +1,12 @@
 # query_db.py
 import sys
 import os
-from langchain_community.utilities import SQLDatabase
 from langchain.chains import create_sql_query_chain
 from langchain_community.llms import Ollama
 from dotenv import load_dotenv
+from sqlalchemy import create_engine
+
+from database_LLM_agent.schema_info import SchemaInfoProvider, langchain_sql_database
 
 load_dotenv()
 
@@ -16,7 +18,10 @@ db_service = os.getenv("DB_SERVICE")
 
 db_uri = f"oracle+oracledb://{db_user}:{db_password}@{db_host}:{db_port}/{db_service}"
 
-db = SQLDatabase.from_uri(db_uri, include_tables=['sales', 'employees'])
+# One-shot CLI: use the schema snapshot without a background refresher
+schema_provider = SchemaInfoProvider(create_engine(db_uri), include_tables=['sales', 'employees'],
+                                     refresh_seconds=0).start()
+db = langchain_sql_database(schema_provider)
 llm = Ollama(model="llama3.2:1b")
 db_chain = create_sql_query_chain(llm, db)
 
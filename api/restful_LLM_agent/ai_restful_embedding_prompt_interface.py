@@ -1,13 +1,18 @@
 from flask import Flask, request, Response, jsonify, stream_with_context
 from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
-from langchain_community.llms import Ollama
 import requests
 import numpy as np
 import json
 import os
+import re
+import sys
+import threading
 from sqlalchemy import create_engine, text
 
+# Rule-based extractor shared with the NoLLM services
+sys.path.insert(0, os.getenv("PARAM_EXTRACTOR_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "../database_NoLLM_agent")))
+from param_extractor import GazetteerTrie, ParamExtractor, load_gazetteer, parse_gazetteer_columns
+
 app = Flask(__name__)
 
 # DB connection
@@ -22,135 +27,222 @@ print("db_uri====", db_uri)
 
 engine = create_engine(db_uri)
 
-# Embedding and LLM
+# Embedding model
 embedder = SentenceTransformer(os.getenv('LOCAL_EMBED_MODEL'))
-llm = Ollama(model="llama3.2:1b", temperature=0.0)
 
-# Cache mapping in memory
+# Parameter extraction: rules first, the LLM only for what the rules miss
+GAZETTEER_COLUMNS = parse_gazetteer_columns(os.getenv("GAZETTEER_COLUMNS", ""))
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434").rstrip("/")
+PARAM_LLM_MODEL = os.getenv("PARAM_LLM_MODEL", "llama3.2:1b")
+PARAM_LLM_TIMEOUT = float(os.getenv("PARAM_LLM_TIMEOUT", "60"))
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+
+# HTTP client for rado.py and Ollama: one keep-alive session, pooled per host
+RADO_BASE_URL = os.getenv("RADO_BASE_URL", "http://localhost:5005").rstrip("/")
+PROXY_CONNECT_TIMEOUT = float(os.getenv("PROXY_CONNECT_TIMEOUT", "3.05"))
+PROXY_READ_TIMEOUT = float(os.getenv("PROXY_READ_TIMEOUT", "300"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "32"))
+
+http = requests.Session()
+http.mount("http://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE))
+http.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE))
+
+# Intent selection: top-k by similarity, reranked with parameter mentions
+INTENT_TOP_K = int(os.getenv("INTENT_TOP_K", "3"))
+INTENT_PARAM_WEIGHT = float(os.getenv("INTENT_PARAM_WEIGHT", "0.15"))
+
+def param_pattern(param):
+    """customer_id -> matches 'customer_id', 'customer id', 'Customer-ID'"""
+    words = [re.escape(w) for w in re.split(r"[\s_\-]+", param.strip()) if w]
+    return re.compile(r"\b" + r"[\s_\-]*".join(words) + r"\b", re.IGNORECASE)
+
+# Cache mapping in memory: intents plus their L2-normalised embedding matrix
+# (row i <-> intent i), swapped together under intent_lock so concurrent
+# requests never see an empty or half-loaded cache during a reload
 intent_cache = []
+intent_matrix = np.zeros((0, 0), dtype=np.float32)
+intent_lock = threading.Lock()
 
 def load_intents_from_db():
-    global intent_cache
+    global intent_cache, intent_matrix
+    # Fetch everything first so the cursor is not held open while encoding
     with engine.connect() as conn:
-        result = conn.execute(text("SELECT intent, endpoint, expected_params FROM api_mappings"))
-        intent_cache = []
-        for row in result:
-            intent_cache.append({
-                "intent": row[0],
-                "endpoint": row[1],
-                "expected_params": json.loads(row[2]),
-                "embedding": embedder.encode(row[0])
-            })
+        rows = conn.execute(text("SELECT intent, endpoint, expected_params FROM api_mappings")).fetchall()
+
+    gazetteer = {}
+    if GAZETTEER_COLUMNS:
+        raw = engine.raw_connection()
+        try:
+            gazetteer = load_gazetteer(raw, GAZETTEER_COLUMNS)
+        except Exception as e:
+            print("gazetteer load failed:", e)
+        finally:
+            raw.close()
+
+    intents = [{
+        "intent": row[0],
+        "endpoint": row[1],
+        "expected_params": json.loads(row[2]),
+    } for row in rows]
+
+    # One batched forward pass for all intents
+    if intents:
+        matrix = embedder.encode([i["intent"] for i in intents], batch_size=64,
+                                 normalize_embeddings=True).astype(np.float32)
+    else:
+        matrix = np.zeros((0, embedder.get_sentence_embedding_dimension()), dtype=np.float32)
+    # One trie for the reload, and one compiled extractor per distinct parameter set
+    trie = GazetteerTrie(gazetteer)
+    extractors = {}
+    for intent in intents:
+        intent["param_patterns"] = [param_pattern(p) for p in intent["expected_params"]]
+        key = frozenset(p.lower() for p in intent["expected_params"])
+        if key not in extractors:
+            extractors[key] = ParamExtractor(key, gazetteer=trie)
+        intent["extractor"] = extractors[key]
+
+    with intent_lock:
+        intent_cache, intent_matrix = intents, matrix
+
+def get_intent_index():
+    with intent_lock:
+        return intent_cache, intent_matrix
 
 # Reload mappings at startup
 load_intents_from_db()
 
-import re
-
-def count_param_hits(prompt, expected_params):
-    prompt_lower = prompt.lower()
-    return sum(1 for param in expected_params if re.search(param.lower(), prompt_lower))
-
 def find_best_intent(user_query):
-    user_vec = embedder.encode(user_query)
-    similarities = [
-        cosine_similarity([user_vec], [ex["embedding"]])[0][0] for ex in intent_cache
-    ]
-
-    print("similarities:", similarities)
-
-    # Take top 3
-    top_matches = sorted(
-        zip(intent_cache, similarities),
-        key=lambda x: x[1],
-        reverse=True
-    )[:3]
-
-    # Re-rank by how many params are mentioned in prompt
-    ranked = sorted(
-        top_matches,
-        key=lambda x: count_param_hits(user_query, x[0]["expected_params"]),
-        reverse=True
-    )
-
-    best_match = ranked[0][0]
+    """
+    Score all intents with one matrix-vector product, take the top INTENT_TOP_K
+    with argpartition, then fuse similarity with the share of expected
+    parameters the prompt mentions (weight INTENT_PARAM_WEIGHT).
+    """
+    intents, matrix = get_intent_index()
+    if not intents:
+        return None
+    user_vec = embedder.encode(user_query, normalize_embeddings=True).astype(np.float32)
+    sims = matrix @ user_vec
+
+    k = min(INTENT_TOP_K, len(intents))
+    top = np.argpartition(-sims, k - 1)[:k]
+
+    def fused(i):
+        patterns = intents[i]["param_patterns"]
+        hit_ratio = sum(1 for p in patterns if p.search(user_query)) / len(patterns) if patterns else 0.0
+        return (1 - INTENT_PARAM_WEIGHT) * float(sims[i]) + INTENT_PARAM_WEIGHT * hit_ratio
+
+    best_match = intents[max(top, key=fused)]
     print("Chosen match:", best_match["intent"])
     return best_match
 
 
-def extract_parameters(prompt, expected_params):
-    param_str = ", ".join(expected_params)
-    
-    # dynamically build example JSON
-    example_dict = {k: f"<{k}>" for k in expected_params}
-    example_json = json.dumps(example_dict, indent=4)
-
+def rule_parameters(prompt, intent):
+    """
+    Tier 1: regex/gazetteer rules compiled for the intent's expected_params.
+    Canonical slots (date, year, limit) fill parameters named *_date, *_year, *_limit.
+    """
+    found = intent["extractor"].extract(prompt)
+    params = {}
+    for name in intent["expected_params"]:
+        key = name.lower()
+        if key in found:
+            params[name] = found[key]
+            continue
+        for slot in ("date", "year", "limit"):
+            if key.endswith("_" + slot) and slot in found:
+                params[name] = found[slot]
+                break
+    return params
+
+
+def llm_parameters(prompt, names):
+    """
+    Tier 2: one Ollama call for the parameters the rules could not resolve.
+    The JSON schema goes in Ollama's `format` field, so the reply is always a
+    bare JSON object with exactly these keys (null when not mentioned).
+    """
+    schema = {
+        "type": "object",
+        "properties": {n: {"type": ["string", "number", "null"]} for n in names},
+        "required": list(names),
+    }
     extraction_prompt = f"""
-You are given a user prompt and a list of expected parameters: {param_str}
+You are given a user prompt and a list of expected parameters: {", ".join(names)}
 
-Extract only those parameters that are actually mentioned in the prompt. Do not guess missing ones.
+Extract only those parameters that are actually mentioned in the prompt. Do not guess missing ones;
+use null for any parameter the prompt does not mention. Dates must be YYYY-MM-DD.
 
 User Prompt:
 \"\"\"{prompt}\"\"\"
-
-Return a valid JSON object with only the mentioned parameters. No code, no explanation.
-
-Example format:
-{example_json}
 """
-
-
-    result = llm(extraction_prompt).strip()
+    r = http.post(f"{OLLAMA_BASE_URL}/api/generate", json={
+        "model": PARAM_LLM_MODEL,
+        "prompt": extraction_prompt,
+        "format": schema,
+        "stream": False,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+        "options": {"temperature": 0.0},
+    }, timeout=PARAM_LLM_TIMEOUT)
+    r.raise_for_status()
+    result = r.json()["response"]
+    print("LLM result:", result)
     try:
-        if result.startswith("```json"):
-            result = result.lstrip("```json").rstrip("```").strip()
-        elif result.startswith("```"):
-            result = result.lstrip("```").rstrip("```").strip()
-        print("LLM result:", result)
-        return json.loads(result)
-    except Exception as e:
+        values = json.loads(result)
+    except ValueError as e:
         raise ValueError(f"LLM output could not be parsed as JSON: {e}\nOutput was:\n{result}")
+    return {n: values[n] for n in names if values.get(n) not in (None, "")}
+
+
+def extract_parameters(prompt, intent):
+    params = rule_parameters(prompt, intent)
+    missing = [p for p in intent["expected_params"] if p not in params]
+    if missing:
+        params.update(llm_parameters(prompt, missing))
+    return params
 
 @app.route("/query", methods=["POST"])
 def smart_query():
     data = request.get_json()
     user_prompt = data.get("prompt")
-    model = data.get("model", "llama3.2:1b")
-
-    # Run LLM to get SQL
-    llm = Ollama(
-        model=model,
-        temperature=0.0,
-        top_k=40,
-        top_p=0.9
-    )
+
     if not user_prompt:
         return jsonify({"error": "Missing prompt"}), 400
 
     matched = find_best_intent(user_prompt)
+    if matched is None:
+        return jsonify({"error": "No intents loaded"}), 404
     expected_params = matched["expected_params"]
    
     print("expected params:", expected_params)
 
     try:
-        extracted_params = extract_parameters(user_prompt, expected_params)
+        extracted_params = extract_parameters(user_prompt, matched)
     except Exception as e:
         return jsonify({"error": "Parameter extraction failed", "details": str(e)}), 500
 
+    # Open the upstream response before returning, so connection errors become a 502
     try:
-        def stream():
-            with requests.post(f"http://localhost:5005{matched['endpoint']}", json=extracted_params, stream=True) as r:
-                for line in r.iter_lines():
-                    if line:
-                        yield line.decode() + "\n"
-        return Response(stream_with_context(stream()), content_type="application/x-ndjson")
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        upstream = http.post(f"{RADO_BASE_URL}{matched['endpoint']}", json=extracted_params, stream=True,
+                             timeout=(PROXY_CONNECT_TIMEOUT, PROXY_READ_TIMEOUT))
+    except requests.RequestException as e:
+        return jsonify({"error": str(e)}), 502
+
+    def stream():
+        # Bytes are passed through as they arrive; rado.py already frames NDJSON lines
+        try:
+            for chunk in upstream.iter_content(chunk_size=None):
+                yield chunk
+        finally:
+            upstream.close()
+
+    return Response(stream_with_context(stream()), status=upstream.status_code,
+                    content_type=upstream.headers.get("Content-Type", "application/x-ndjson"))
 
 @app.route("/reload-intents", methods=["POST"])
 def reload():
     load_intents_from_db()
-    return jsonify({"status": "reloaded", "total": len(intent_cache)})
+    intents, _ = get_intent_index()
+    return jsonify({"status": "reloaded", "total": len(intents)})
 
 @app.route("/health", methods=["GET"])
 def health():
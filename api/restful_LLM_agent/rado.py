@@ -1,9 +1,13 @@
 from flask import Flask, request, Response, jsonify, stream_with_context
 from sqlalchemy import create_engine, text
 import os
+import re
 import json
+import queue
+import threading
 import datetime
 import decimal
+from concurrent.futures import ThreadPoolExecutor
 
 app = Flask(__name__)
 
@@ -14,7 +18,142 @@ db_host = os.getenv("DB_HOST", "localhost")
 db_port = os.getenv("DB_PORT", "1521")
 db_service = os.getenv("DB_SERVICE", "orclpdb1")
 db_uri = f"oracle+oracledb://{db_user}:{db_password}@{db_host}:{db_port}/{db_service}"
-engine = create_engine(db_uri)
+# oracledb keeps parsed statements per connection; bind SQL makes them reusable
+engine = create_engine(db_uri, connect_args={"stmtcachesize": int(os.getenv("DB_STMT_CACHE_SIZE", "50"))})
+
+# Template registry: endpoint_name -> compiled template, loaded once and
+# swapped as a whole on reload
+templates = {}
+templates_lock = threading.Lock()
+
+# '{param}' (quoted string literal) or bare {param}
+PLACEHOLDER_RE = re.compile(r"'\{(\w+)\}'|\{(\w+)\}")
+
+def compile_template(sql_template, suffix=""):
+    """
+    Turn a {param} template into bind-variable SQL.
+    Quoted placeholders lose their quotes: TO_DATE('{sale_date}', ...) -> TO_DATE(:sale_date, ...)
+    suffix is appended to every bind name (used to keep UNION ALL branches apart).
+    Returns (bind_sql, [param names in order of first use]).
+    """
+    names = []
+
+    def to_bind(m):
+        name = (m.group(1) or m.group(2)).lower()
+        if name not in names:
+            names.append(name)
+        return f":{name}{suffix}"
+
+    return PLACEHOLDER_RE.sub(to_bind, sql_template), names
+
+def load_templates():
+    global templates
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT endpoint_name, sql_text FROM rado_sql_queries")).fetchall()
+
+    compiled = {}
+    for endpoint_name, sql_text in rows:
+        sql_text = sql_text.read() if hasattr(sql_text, "read") else sql_text
+        bind_sql, params = compile_template(sql_text)
+        compiled[endpoint_name] = {
+            "template": sql_text,
+            "sql": bind_sql,
+            "params": params,
+            # Built once so SQLAlchemy's compiled cache is hit on every call
+            "statement": text(bind_sql),
+        }
+
+    with templates_lock:
+        templates = compiled
+    print(f"Loaded {len(compiled)} SQL templates")
+
+def get_template(endpoint_name):
+    with templates_lock:
+        return templates.get(endpoint_name)
+
+def bind_values(template, params):
+    """Binds for the template's parameters (case-insensitive); raises KeyError on a missing one."""
+    lower_params = {k.lower(): v for k, v in params.items()}
+    return {name: lower_params[name] for name in template["params"]}
+
+load_templates()
+
+# Batch execution
+BATCH_UNION_SIZE = int(os.getenv("BATCH_UNION_SIZE", "50"))   # parameter sets per UNION ALL statement
+BATCH_MAX_SETS = int(os.getenv("BATCH_MAX_SETS", "500"))
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))          # keep <= the engine's pool size
+BATCH_EXECUTOR = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="rado-batch")
+_BATCH_DONE = object()
+
+def union_statement(template, indexes):
+    """
+    One statement for several parameter sets:
+      SELECT 0 AS batch_index, q.* FROM (<sql with :p_0 binds>) q UNION ALL SELECT 1 ...
+    Bind names get a _<n> suffix per branch.
+    """
+    branches = []
+    for n, i in enumerate(indexes):
+        sql, _ = compile_template(template["template"], f"_{n}")
+        branches.append(f"SELECT {int(i)} AS batch_index, q.* FROM ({sql}) q")
+    return text(" UNION ALL ".join(branches))
+
+def union_binds(bind_sets):
+    return {f"{name}_{n}": value for n, binds in enumerate(bind_sets) for name, value in binds.items()}
+
+def stream_union(template, groups):
+    """
+    groups: [(bind dict, [batch indexes sharing it])]. Runs BATCH_UNION_SIZE
+    sets per statement and yields rows tagged with "_batch".
+    Raises before the first row if the rewrite is rejected (e.g. duplicate
+    column names in the template's select list), so the caller can fall back.
+    """
+    with engine.connect() as conn:
+        for start in range(0, len(groups), BATCH_UNION_SIZE):
+            chunk = groups[start:start + BATCH_UNION_SIZE]
+            statement = union_statement(template, range(start, start + len(chunk)))
+            result_proxy = conn.execution_options(stream_results=True).execute(
+                statement, union_binds([binds for binds, _ in chunk]))
+            columns = list(result_proxy.keys())[1:]
+            for row in result_proxy:
+                data = serialize_row(row[1:], columns)
+                for i in chunk[int(row[0]) - start][1]:
+                    yield json.dumps({"_batch": i, **data}) + "\n"
+
+def stream_concurrent(template, groups):
+    """Each parameter set on its own pooled connection; rows interleaved as they arrive."""
+    out = queue.Queue()
+    cancelled = threading.Event()
+
+    def worker(binds, indexes):
+        try:
+            with engine.connect() as conn:
+                result_proxy = conn.execution_options(stream_results=True).execute(template["statement"], binds)
+                columns = result_proxy.keys()
+                for row in result_proxy:
+                    if cancelled.is_set():
+                        break
+                    data = serialize_row(row, columns)
+                    for i in indexes:
+                        out.put(json.dumps({"_batch": i, **data}) + "\n")
+        except Exception as e:
+            for i in indexes:
+                out.put(json.dumps({"_batch": i, "error": str(e)}) + "\n")
+        finally:
+            out.put(_BATCH_DONE)
+
+    for binds, indexes in groups:
+        BATCH_EXECUTOR.submit(worker, binds, indexes)
+
+    try:
+        pending = len(groups)
+        while pending:
+            item = out.get()
+            if item is _BATCH_DONE:
+                pending -= 1
+                continue
+            yield item
+    finally:
+        cancelled.set()
 
 # Helpers
 def serialize_value(val):
@@ -32,43 +171,84 @@ def serialize_row(row, columns):
 def execute_param_query(endpoint_name):
     params = request.get_json() or {}
 
+    template = get_template(endpoint_name)
+    if not template:
+        return jsonify({"error": f"No SQL found for endpoint '{endpoint_name}'"}), 404
+
     try:
-        # First fetch the SQL template (short-lived connection)
-        with engine.connect() as conn:
-            result = conn.execute(
-                text("SELECT sql_text FROM rado_sql_queries WHERE endpoint_name = :name"),
-                {"name": endpoint_name}
-            ).fetchone()
+        binds = bind_values(template, params)
+    except KeyError as e:
+        return jsonify({
+            "error": f"Missing parameter: {e.args[0]}",
+            "required_sql": template["template"]
+        }), 400
+
+    def generate():
+        try:
+            with engine.connect() as conn:
+                result_proxy = conn.execution_options(stream_results=True).execute(template["statement"], binds)
+                columns = result_proxy.keys()
+                for row in result_proxy:
+                    yield json.dumps(serialize_row(row, columns)) + "\n"
+        except Exception as e:
+            yield json.dumps({"error": str(e), "sql": template["sql"]}) + "\n"
 
-        if not result:
-            return jsonify({"error": f"No SQL found for endpoint '{endpoint_name}'"}), 404
+    return Response(stream_with_context(generate()), content_type="application/x-ndjson")
 
-        sql_template = result[0]
+# Batch endpoint: many parameter sets for one template in a single request
+@app.route("/execute-batch/<endpoint_name>", methods=["POST"])
+def execute_batch(endpoint_name):
+    body = request.get_json() or {}
+    param_sets = body if isinstance(body, list) else body.get("params", [])
+    mode = "union" if isinstance(body, list) else body.get("mode", "union")
 
+    if not isinstance(param_sets, list) or not param_sets:
+        return jsonify({"error": "Expected a non-empty list of parameter sets"}), 400
+    if len(param_sets) > BATCH_MAX_SETS:
+        return jsonify({"error": f"At most {BATCH_MAX_SETS} parameter sets per batch"}), 400
+
+    template = get_template(endpoint_name)
+    if not template:
+        return jsonify({"error": f"No SQL found for endpoint '{endpoint_name}'"}), 404
+
+    # Identical parameter sets run once; their rows are emitted for every index
+    groups = {}
+    for i, params in enumerate(param_sets):
         try:
-            final_sql = sql_template.format(**params)
+            binds = bind_values(template, params or {})
         except KeyError as e:
             return jsonify({
                 "error": f"Missing parameter: {e.args[0]}",
-                "required_sql": sql_template
+                "batch_index": i,
+                "required_sql": template["template"]
             }), 400
-        except Exception as e:
-            return jsonify({"error": f"Parameter substitution failed: {str(e)}"}), 400
+        key = json.dumps(binds, sort_keys=True, default=str)
+        groups.setdefault(key, (binds, []))[1].append(i)
+    groups = list(groups.values())
 
-        def generate():
+    def generate():
+        if mode == "union" and template["params"] and len(groups) > 1:
+            rows = stream_union(template, groups)
             try:
-                with engine.connect() as conn:
-                    result_proxy = conn.execution_options(stream_results=True).execute(text(final_sql))
-                    columns = result_proxy.keys()
-                    for row in result_proxy:
-                        yield json.dumps(serialize_row(row, columns)) + "\n"
+                first = next(rows, None)
             except Exception as e:
-                yield json.dumps({"error": str(e), "sql": final_sql}) + "\n"
+                print(f"UNION ALL batch rejected for '{endpoint_name}', running concurrently: {e}")
+            else:
+                if first is not None:
+                    yield first
+                try:
+                    yield from rows
+                except Exception as e:
+                    yield json.dumps({"error": str(e), "sql": template["sql"]}) + "\n"
+                return
+        yield from stream_concurrent(template, groups)
 
-        return Response(stream_with_context(generate()), content_type="application/x-ndjson")
+    return Response(stream_with_context(generate()), content_type="application/x-ndjson")
 
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+@app.route("/reload-templates", methods=["POST"])
+def reload_templates():
+    load_templates()
+    return jsonify({"status": "reloaded", "total": len(templates)})
 
 # Healthcheck
 @app.route("/health", methods=["GET"])
@@ -18,4 +18,8 @@ curl -X POST http://127.0.0.1:5000/query \
 
      curl -X POST http://127.0.0.1:5010/query \
      -H "Content-Type: application/json" \
-     -d '{"prompt": "show all reports" , "model_name": "llama3.2:1b" }'
\ No newline at end of file
+     -d '{"prompt": "show all reports" , "model_name": "llama3.2:1b" }'
+
+curl -X POST http://127.0.0.1:5011/query \
+     -H "Content-Type: application/json" \
+     -d '{"prompt": "revenue for {year=2024} {limit=5}", "fanout": true}'
@@ -4,3 +4,16 @@ curl -X POST http://localhost:5005/execute/customer_sales \
     "customer_id": "1",
     "sale_date": "'2025-07-01'"
   }'
+
+# Reload SQL templates after editing rado_sql_queries
+curl -X POST http://localhost:5005/reload-templates
+
+# Batch: several parameter sets for one endpoint, rows tagged with "_batch" (index into params)
+curl -X POST http://localhost:5005/execute-batch/customer_sales \
+  -H "Content-Type: application/json" \
+  -d '{
+    "params": [
+      {"customer_id": "1", "sale_date": "2025-07-01"},
+      {"customer_id": "2", "sale_date": "2025-07-01"}
+    ]
+  }'
@@ -1,13 +1,10 @@
 import os
 import json
-import math
+import threading
 from flask import Flask, request, Response, jsonify
-import requests
-from bs4 import BeautifulSoup
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 from llama_index import (
-    Document,
     GPTVectorStoreIndex,
     LLMPredictor,
     ServiceContext,
@@ -15,12 +12,19 @@ from llama_index import (
     load_index_from_storage,
 )
 from llama_index.embeddings import HuggingFaceEmbedding
+from llama_index.schema import TextNode
 from llama_index.vector_stores.sql_vector_store import SQLVectorStore
 
 from langchain.llms import Ollama
 from sentence_transformers import SentenceTransformer
 from llama_index import LangchainEmbedding
 
+from html_sections import extract_sections, chunk_sections
+from vector_cache import EmbeddingMatrix
+from web_ingest import (
+    make_session, expand_sitemap, load_page_state, save_page_state, fetch_pages, stale_doc_ids,
+)
+
 
 # Flask app
 app = Flask(__name__)
@@ -53,46 +57,102 @@ service_context = ServiceContext.from_defaults(
     embed_model=embedding_model,
 )
 
+# Ingestion settings
+INGEST_FETCH_WORKERS = int(os.getenv("INGEST_FETCH_WORKERS", "8"))
+INGEST_FETCH_TIMEOUT = float(os.getenv("INGEST_FETCH_TIMEOUT", "20"))
+INGEST_MAX_URLS = int(os.getenv("INGEST_MAX_URLS", "5000"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+# Chunk budget in embedding-model tokens; defaults to what the model can encode
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", str(embedder.max_seq_length - 2)))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+# Changed pages are embedded and written in groups of this many chunks
+INGEST_FLUSH_CHUNKS = int(os.getenv("INGEST_FLUSH_CHUNKS", "512"))
+
+# Similarity search: in-memory matrix, optional HNSW index (needs faiss-cpu)
+VECTOR_ANN = os.getenv("VECTOR_ANN", "false").lower() == "true"
+VECTOR_ANN_MIN_ROWS = int(os.getenv("VECTOR_ANN_MIN_ROWS", "50000"))
+
+http_session = make_session(pool_size=INGEST_FETCH_WORKERS)
+
+MERGE_EMBEDDING_SQL = (
+    "MERGE INTO DOCUMENT_EMBEDDINGS d "
+    "USING (SELECT :doc_id AS doc_id FROM dual) src "
+    "ON (d.doc_id = src.doc_id) "
+    "WHEN MATCHED THEN UPDATE SET embedding = :embedding, text_content = :text_content "
+    "WHEN NOT MATCHED THEN INSERT (doc_id, embedding, text_content) VALUES (:doc_id, :embedding, :text_content)"
+)
+
 # OracleVectorStore class: store embedding as JSON string (simple approach)
 class OracleVectorStore(SQLVectorStore):
     def __init__(self, engine):
         table_name = "DOCUMENT_EMBEDDINGS"
         super().__init__(engine, table_name=table_name)
+        self.cache = EmbeddingMatrix(ann=VECTOR_ANN, ann_min_rows=VECTOR_ANN_MIN_ROWS)
+        self._cache_loaded = False
+        self._cache_lock = threading.Lock()
+
+    def _ensure_cache(self):
+        """Load DOCUMENT_EMBEDDINGS into the matrix once; later changes are applied incrementally."""
+        if self._cache_loaded:
+            return
+        with self._cache_lock:
+            if self._cache_loaded:
+                return
+            batch = []
+            with engine.connect() as conn:
+                result = conn.execution_options(stream_results=True).execute(
+                    text("SELECT doc_id, embedding, text_content FROM DOCUMENT_EMBEDDINGS"))
+                for doc_id, emb_json, text_content in result:
+                    emb_json = emb_json.read() if hasattr(emb_json, "read") else emb_json
+                    text_content = text_content.read() if hasattr(text_content, "read") else text_content
+                    batch.append((doc_id, json.loads(emb_json), text_content))
+                    if len(batch) >= 10000:
+                        self.cache.upsert(batch)
+                        batch = []
+            self.cache.upsert(batch)
+            self._cache_loaded = True
+            print(f"Loaded {len(self.cache)} document embeddings")
 
     def add(self, doc_id: str, embedding: list, text_content: str):
-        embedding_json = json.dumps(embedding)
-        with engine.connect() as conn:
-            conn.execute(
-                text(
-                    "MERGE INTO DOCUMENT_EMBEDDINGS d "
-                    "USING (SELECT :doc_id AS doc_id FROM dual) src "
-                    "ON (d.doc_id = src.doc_id) "
-                    "WHEN MATCHED THEN UPDATE SET embedding = :embedding, text_content = :text_content "
-                    "WHEN NOT MATCHED THEN INSERT (doc_id, embedding, text_content) VALUES (:doc_id, :embedding, :text_content)"
-                ),
-                {"doc_id": doc_id, "embedding": embedding_json, "text_content": text_content},
-            )
+        self.add_many([(doc_id, embedding, text_content)])
+
+    def add_many(self, rows, conn=None):
+        """Bulk upsert of (doc_id, embedding, text_content) rows in one executemany MERGE."""
+        params = [
+            {"doc_id": doc_id, "embedding": json.dumps(list(map(float, embedding))), "text_content": text_content}
+            for doc_id, embedding, text_content in rows
+        ]
+        if not params:
+            return
+        if conn is not None:
+            # Caller owns the transaction and calls cache_upsert after commit
+            conn.execute(text(MERGE_EMBEDDING_SQL), params)
+            return
+        with engine.begin() as conn:
+            conn.execute(text(MERGE_EMBEDDING_SQL), params)
+        self.cache_upsert(rows)
+
+    def delete_many(self, doc_ids, conn):
+        if doc_ids:
+            conn.execute(text("DELETE FROM DOCUMENT_EMBEDDINGS WHERE doc_id = :doc_id"),
+                         [{"doc_id": d} for d in doc_ids])
+
+    # Before the first load there is nothing to keep in sync; the lock makes a
+    # write that commits while the load is running wait and apply afterwards
+    def cache_upsert(self, rows):
+        with self._cache_lock:
+            if self._cache_loaded:
+                self.cache.upsert(rows)
+
+    def cache_delete(self, doc_ids):
+        with self._cache_lock:
+            if self._cache_loaded:
+                self.cache.delete(doc_ids)
 
     def similarity_search(self, query_embedding, top_k=5):
-        # Naive: fetch all embeddings and compute similarity in Python
-        with engine.connect() as conn:
-            result = conn.execute(text("SELECT doc_id, embedding, text_content FROM DOCUMENT_EMBEDDINGS"))
-            rows = result.fetchall()
-
-        def cosine_sim(a, b):
-            dot = sum(x * y for x, y in zip(a, b))
-            norm_a = math.sqrt(sum(x * x for x in a))
-            norm_b = math.sqrt(sum(y * y for y in b))
-            return dot / (norm_a * norm_b + 1e-10)
-
-        sims = []
-        for doc_id, emb_json, text_content in rows:
-            emb = json.loads(emb_json)
-            score = cosine_sim(query_embedding, emb)
-            sims.append((doc_id, text_content, score))
-
-        sims.sort(key=lambda x: x[2], reverse=True)
-        return sims[:top_k]
+        """[(doc_id, text_content, cosine score)] best first, from the in-memory matrix."""
+        self._ensure_cache()
+        return self.cache.search(query_embedding, top_k=top_k)
 
 # Instantiate vector store
 vector_store = OracleVectorStore(engine=engine)
@@ -106,39 +166,12 @@ try:
 except Exception:
     index = GPTVectorStoreIndex([], service_context=service_context, storage_context=storage_context)
 
-# Web scraper for URL
-def scrape_text_from_url(url):
-    resp = requests.get(url)
-    resp.raise_for_status()
-    soup = BeautifulSoup(resp.text, "html.parser")
-    texts = soup.find_all(text=True)
-    visible_texts = filter(tag_visible, texts)
-    return "\n".join(t.strip() for t in visible_texts if t.strip())
-
-def tag_visible(element):
-    from bs4.element import Comment
-    if element.parent.name in ["style", "script", "head", "title", "meta", "[document]"]:
-        return False
-    if isinstance(element, Comment):
-        return False
-    return True
-
-def chunk_text(text, max_len=512):
-    words = text.split()
-    chunks = []
-    current_chunk = []
-    current_len = 0
-    for w in words:
-        if current_len + len(w) + 1 > max_len:
-            chunks.append(" ".join(current_chunk))
-            current_chunk = [w]
-            current_len = len(w) + 1
-        else:
-            current_chunk.append(w)
-            current_len += len(w) + 1
-    if current_chunk:
-        chunks.append(" ".join(current_chunk))
-    return chunks
+def count_tokens(text_):
+    return len(embedder.tokenizer.encode(text_, add_special_tokens=False))
+
+def chunk_page(sections):
+    return chunk_sections(sections, count_tokens, max_tokens=CHUNK_MAX_TOKENS,
+                          overlap_tokens=CHUNK_OVERLAP_TOKENS)
 
 # Prompt template to feed LLM
 prompt_template = """
@@ -153,28 +186,87 @@ Question:
 Answer:
 """
 
+# Ingest helpers
+def ingest_pages(pages):
+    """
+    Chunk, batch-embed and store a group of changed pages: one executemany
+    MERGE for the chunks, stale chunks of shrunken pages deleted, page state
+    saved in the same transaction, then one batched insert into LlamaIndex.
+    """
+    rows, stale = [], []
+    for page in pages:
+        chunks = page["chunks"]
+        page["chunk_count"] = len(chunks)
+        rows.extend((f"{page['url']}__{i}", chunk) for i, chunk in enumerate(chunks))
+        stale.extend(stale_doc_ids(page["url"], len(chunks), page["previous_chunks"]))
+
+    embeddings = embedder.encode([chunk for _, chunk in rows], batch_size=EMBED_BATCH_SIZE) if rows else []
+
+    stored = [(doc_id, emb, chunk) for (doc_id, chunk), emb in zip(rows, embeddings)]
+    with engine.begin() as conn:
+        vector_store.add_many(stored, conn=conn)
+        vector_store.delete_many(stale, conn)
+        save_page_state(conn, pages)
+    vector_store.cache_upsert(stored)
+    vector_store.cache_delete(stale)
+
+    # Embeddings are attached, so LlamaIndex does not embed the nodes again
+    index.insert_nodes([
+        TextNode(text=chunk, id_=doc_id, embedding=[float(x) for x in emb])
+        for (doc_id, chunk), emb in zip(rows, embeddings)
+    ])
+    return len(rows)
+
 # Ingest endpoint
 @app.route("/ingest", methods=["POST"])
 def ingest():
-    data = request.json
-    url = data.get("url")
-    if not url:
-        return jsonify({"error": "Missing URL"}), 400
+    """
+    Body: {"url": ...} | {"urls": [...]} | {"sitemap": ...}, optional "force": true
+    to ignore stored ETag / Last-Modified / content hashes.
+    """
+    data = request.json or {}
+    urls = list(data.get("urls") or [])
+    if data.get("url"):
+        urls.append(data["url"])
+    force = bool(data.get("force"))
 
     try:
-        text = scrape_text_from_url(url)
-        chunks = chunk_text(text)
-
-        for i, chunk in enumerate(chunks):
-            doc_id = f"{url}__{i}"
-            embedding = embedding_model.get_embedding(chunk)
-            vector_store.add(doc_id=doc_id, embedding=embedding, text_content=chunk)
-            # Also insert to LlamaIndex
-            doc = Document(text=chunk, doc_id=doc_id)
-            index.insert(doc)
-
-        index.storage_context.persist()
-        return jsonify({"status": "success", "chunks_ingested": len(chunks)})
+        if data.get("sitemap"):
+            urls.extend(expand_sitemap(http_session, data["sitemap"], timeout=INGEST_FETCH_TIMEOUT,
+                                       limit=INGEST_MAX_URLS))
+        if not urls:
+            return jsonify({"error": "Missing URL"}), 400
+        urls = list(dict.fromkeys(urls))[:INGEST_MAX_URLS]
+
+        state = load_page_state(engine, urls)
+        summary = {"changed": 0, "unchanged": 0, "same_hash": 0, "error": 0}
+        errors, pending, pending_chunks, same_hash, chunks_ingested = [], [], 0, [], 0
+
+        for page in fetch_pages(http_session, urls, state, extract_sections,
+                                workers=INGEST_FETCH_WORKERS, timeout=INGEST_FETCH_TIMEOUT, force=force):
+            summary[page["status"]] += 1
+            if page["status"] == "error":
+                errors.append({"url": page["url"], "error": page["error"]})
+            elif page["status"] == "same_hash":
+                same_hash.append(page)
+            elif page["status"] == "changed":
+                page["chunks"] = chunk_page(page.pop("content"))
+                pending.append(page)
+                pending_chunks += len(page["chunks"])
+                if pending_chunks >= INGEST_FLUSH_CHUNKS:
+                    chunks_ingested += ingest_pages(pending)
+                    pending, pending_chunks = [], 0
+
+        if pending:
+            chunks_ingested += ingest_pages(pending)
+        if same_hash:
+            with engine.begin() as conn:
+                save_page_state(conn, same_hash)
+        if summary["changed"]:
+            index.storage_context.persist()
+
+        return jsonify({"status": "success", "pages": summary, "chunks_ingested": chunks_ingested,
+                        "errors": errors})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -200,12 +292,27 @@ def search():
     # Step 4: Format prompt with context and question
     prompt = prompt_template.format(context=context_text, question=query)
 
-    # Step 5: Query LLM with prompt and get response
-    response_text = llm(prompt)
+    # Step 5: Stream the answer. Events, one per line:
+    #   {"sources": [{"doc_id", "score"}]}   retrieved context, sent before generation
+    #   {"token": "..."}                       answer text as Ollama produces it
+    #   {"result": "..."}                      full answer (or {"error": ...})
+    sources = [{"doc_id": doc_id, "score": round(score, 4)} for doc_id, _, score in similar_docs]
 
     def generate():
-        # Streaming or chunked response can be implemented here if Ollama supports it
-        yield json.dumps({"result": response_text}) + "\n"
+        yield json.dumps({"sources": sources}) + "\n"
+        tokens = llm.stream(prompt)
+        answer = ""
+        try:
+            for token in tokens:
+                answer += token
+                yield json.dumps({"token": token}) + "\n"
+            yield json.dumps({"result": answer.strip()}) + "\n"
+        except Exception as e:
+            yield json.dumps({"error": str(e), "result": answer.strip()}) + "\n"
+        finally:
+            # Runs on client disconnect too (GeneratorExit): closing the token
+            # stream drops the Ollama connection, which stops generation
+            tokens.close()
 
     return Response(generate(), mimetype="application/x-ndjson")
 
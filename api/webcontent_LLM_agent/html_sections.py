@@ -0,0 +1,207 @@
+"""
+html_sections.py
+
+Extraction and chunking for web ingestion:
+- Parses with lxml and drops boilerplate (scripts, navigation, headers,
+  footers, sidebars, cookie banners), preferring <main>/<article> when present.
+  Class / id names must match a boilerplate name as a whole token
+  ("sidebar" yes, "no-sidebar" no), and a subtree holding most of the
+  page's headings or text is never dropped
+- Emits heading-scoped sections: {"heading": "Install > Linux", "text": ...}
+- Packs sections into chunks by token budget (the embedding model's own
+  tokenizer), with overlap inside long sections; every chunk starts with its
+  heading path, so short pages and small sections share one chunk
+"""
+
+import re
+from typing import Callable, Dict, List
+
+import lxml.html
+
+# Removed with their whole subtree
+DROP_TAGS = {"script", "style", "noscript", "template", "svg", "iframe", "form", "button", "select",
+             "nav", "header", "footer", "aside", "head"}
+DROP_ROLES = {"navigation", "banner", "contentinfo", "complementary", "search", "dialog"}
+# Whole class / id tokens (lower-cased) marking boilerplate containers
+BOILERPLATE_TOKENS = {
+    "nav", "navbar", "navigation", "menu", "breadcrumb", "breadcrumbs", "footer", "site-footer",
+    "header", "site-header", "masthead", "sidebar", "cookie", "cookies", "cookie-banner",
+    "cookie-consent", "consent", "banner", "share", "share-buttons", "social", "social-share",
+    "related", "related-posts", "advert", "advertisement", "ads", "promo", "subscribe",
+    "newsletter", "skip-link", "pagination",
+}
+HEADINGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+# Text taken as one unit; their children are not walked separately
+TEXT_BLOCKS = {"p", "li", "pre", "blockquote", "td", "th", "dt", "dd", "caption", "figcaption"}
+
+_SPACE_RE = re.compile(r"[ \t\r\f\v]+")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def _clean(text_: str) -> str:
+    return "\n".join(line.strip() for line in _SPACE_RE.sub(" ", text_).splitlines() if line.strip())
+
+
+def _is_boilerplate(el) -> bool:
+    if el.tag in DROP_TAGS or el.get("role") in DROP_ROLES or el.get("aria-hidden") == "true":
+        return True
+    tokens = f"{el.get('id', '')} {el.get('class', '')}".lower().split()
+    return any(t in BOILERPLATE_TOKENS for t in tokens)
+
+
+def _heading_count(el) -> int:
+    return sum(1 for _ in el.iter(*HEADINGS))
+
+
+def _prune(body):
+    """Drop boilerplate subtrees below body, keeping any that hold most of its headings or text."""
+    total_headings = _heading_count(body)
+    total_text = len(body.text_content())
+
+    def holds_content(el):
+        if total_headings and _heading_count(el) * 2 > total_headings:
+            return True
+        return el.tag not in ("script", "style") and len(el.text_content()) * 2 > total_text
+
+    def visit(el):
+        for child in list(el):
+            if not isinstance(child.tag, str):
+                continue
+            if _is_boilerplate(child) and not holds_content(child):
+                child.drop_tree()
+            else:
+                visit(child)
+
+    visit(body)
+
+
+def extract_sections(html) -> List[Dict[str, str]]:
+    """Heading-scoped sections of the page's main content, in document order."""
+    root = lxml.html.document_fromstring(html)
+    for el in list(root.iter(lxml.etree.Comment, lxml.etree.ProcessingInstruction)):
+        el.drop_tree()
+    body = root
+    for path_ in (".//main", ".//article", ".//*[@role='main']", "body"):
+        found = root.find(path_)
+        if found is not None:
+            body = found
+            break
+    _prune(body)
+
+    title = root.findtext(".//title") or ""
+    sections: List[Dict[str, str]] = []
+    path: List[tuple] = []      # [(level, heading text)]
+    current: List[str] = []
+
+    def flush():
+        if current:
+            heading = " > ".join(h for _, h in path) or _clean(title)
+            sections.append({"heading": heading, "text": "\n".join(current)})
+            current.clear()
+
+    def add(text_):
+        text_ = _clean(text_ or "")
+        if text_:
+            current.append(text_)
+
+    def walk(el):
+        if el.tag in HEADINGS:
+            flush()
+            level = HEADINGS[el.tag]
+            while path and path[-1][0] >= level:
+                path.pop()
+            path.append((level, _clean(el.text_content()).replace("\n", " ")))
+            return
+        if el.tag in TEXT_BLOCKS:
+            add(el.text_content())
+            return
+        add(el.text)
+        for child in el:
+            if isinstance(child.tag, str):
+                walk(child)
+            add(child.tail)
+
+    walk(body)
+    flush()
+    return sections
+
+
+def _split_oversized(unit: str, max_tokens: int, count_tokens: Callable[[str], int]) -> List[str]:
+    """Word-level split of a sentence that alone exceeds the budget."""
+    pieces, words, used = [], [], 0
+    for word in unit.split():
+        n = count_tokens(word)
+        if words and used + n > max_tokens:
+            pieces.append(" ".join(words))
+            words, used = [], 0
+        words.append(word)
+        used += n
+    if words:
+        pieces.append(" ".join(words))
+    return pieces
+
+
+def chunk_sections(sections: List[Dict[str, str]], count_tokens: Callable[[str], int],
+                   max_tokens: int = 256, overlap_tokens: int = 32) -> List[str]:
+    """
+    Chunks of at most ~max_tokens (by count_tokens). Sections are split into
+    sentences; a long section continues in the next chunk with its last
+    ~overlap_tokens of sentences repeated. Small sections are packed together.
+    """
+    chunks: List[str] = []
+    parts: List[str] = []        # text of the chunk being built
+    used = 0
+
+    def emit():
+        nonlocal parts, used
+        if parts:
+            chunks.append("\n".join(parts))
+        parts, used = [], 0
+
+    for section in sections:
+        heading = section["heading"]
+        heading_tokens = count_tokens(heading) + 1 if heading else 0
+        units = []
+        for sentence in (s for line in section["text"].split("\n") for s in _SENTENCE_RE.split(line) if s.strip()):
+            n = count_tokens(sentence)
+            if n + heading_tokens > max_tokens:
+                units.extend((p, count_tokens(p)) for p in
+                             _split_oversized(sentence, max_tokens - heading_tokens, count_tokens))
+            else:
+                units.append((sentence, n))
+        if not units:
+            continue
+
+        # Start the section in the current chunk only if its heading and first unit fit
+        if used + heading_tokens + units[0][1] > max_tokens:
+            emit()
+        if heading:
+            parts.append(heading)
+            used += heading_tokens
+        section_units = []
+        for unit, n in units:
+            if used + n > max_tokens:
+                emit()
+                # Carry the tail of this section into the next chunk
+                carry, carried = [], 0
+                for prev, pn in reversed(section_units):
+                    if carried + pn > overlap_tokens:
+                        break
+                    carry.insert(0, (prev, pn))
+                    carried += pn
+                if carried + n + heading_tokens > max_tokens:
+                    carry, carried = [], 0
+                if heading:
+                    parts.append(heading)
+                parts.extend(u for u, _ in carry)
+                used = heading_tokens + carried
+                section_units = list(carry)
+            parts.append(unit)
+            used += n
+            section_units.append((unit, n))
+    emit()
+    return chunks
+
+
+def sections_text(sections: List[Dict[str, str]]) -> str:
+    return "\n\n".join(f"{s['heading']}\n{s['text']}" if s["heading"] else s["text"] for s in sections)
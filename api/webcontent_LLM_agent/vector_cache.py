@@ -0,0 +1,185 @@
+"""
+vector_cache.py
+
+In-memory copy of DOCUMENT_EMBEDDINGS for similarity search:
+- Normalised float32 matrix in a growable buffer, plus doc ids and texts
+- Upserts and deletes are applied in place, so ingestion never forces a reload
+- Exact search is one matrix-vector product plus argpartition
+- Optional HNSW index (faiss) once the corpus reaches ann_min_rows; candidates
+  it returns are re-scored exactly. Appends are added to the index; updates
+  and deletes discard it, and it is rebuilt in a background thread while
+  searches fall back to exact search
+"""
+
+import threading
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+
+def _normalise(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-10)
+
+
+class EmbeddingMatrix:
+
+    def __init__(self, ann: bool = False, ann_min_rows: int = 50000, ann_candidates: int = 10,
+                 hnsw_m: int = 32, hnsw_ef_search: int = 128):
+        if ann and faiss is None:
+            print("VECTOR_ANN requested but faiss is not installed; using exact search")
+        self.ann = ann and faiss is not None
+        self.ann_min_rows = ann_min_rows
+        self.ann_candidates = ann_candidates
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_search = hnsw_ef_search
+
+        self._lock = threading.Lock()
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._count = 0
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._pos = {}
+        self._ann_index = None
+        self._ann_rows = 0
+        self._ann_generation = 0     # bumped whenever the index is discarded
+        self._ann_building = False
+        self._ann_build_rows = 0     # rows the running rebuild reads
+
+    def __len__(self):
+        return self._count
+
+    # -------------------------------------------------------------------------
+    # Updates
+    # -------------------------------------------------------------------------
+    def upsert(self, rows: Iterable[Tuple[str, Sequence[float], str]]):
+        rows = list(rows)
+        if not rows:
+            return
+        vectors = _normalise(np.asarray([emb for _, emb, _ in rows], dtype=np.float32))
+        with self._lock:
+            if self._matrix.shape[1] != vectors.shape[1]:
+                if self._count:
+                    raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match "
+                                     f"the cached {self._matrix.shape[1]}")
+                self._matrix = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+            for (doc_id, _, text_content), vec in zip(rows, vectors):
+                pos = self._pos.get(doc_id)
+                if pos is None:
+                    pos = self._append_slot()
+                    self._pos[doc_id] = pos
+                    self._ids.append(doc_id)
+                    self._texts.append(text_content)
+                else:
+                    self._texts[pos] = text_content
+                    if pos < max(self._ann_rows, self._ann_build_rows):
+                        self._discard_ann()   # HNSW cannot update vectors in place
+                self._matrix[pos] = vec
+
+    def delete(self, doc_ids: Iterable[str]):
+        with self._lock:
+            for doc_id in doc_ids:
+                pos = self._pos.pop(doc_id, None)
+                if pos is None:
+                    continue
+                # Move the last row into the hole
+                last = self._count - 1
+                if pos != last:
+                    self._matrix[pos] = self._matrix[last]
+                    self._ids[pos] = self._ids[last]
+                    self._texts[pos] = self._texts[last]
+                    self._pos[self._ids[pos]] = pos
+                self._ids.pop()
+                self._texts.pop()
+                self._count -= 1
+                self._discard_ann()
+
+    def _append_slot(self) -> int:
+        if self._count == self._matrix.shape[0]:
+            capacity = max(1024, self._matrix.shape[0] * 2)
+            grown = np.zeros((capacity, self._matrix.shape[1]), dtype=np.float32)
+            grown[:self._count] = self._matrix[:self._count]
+            self._matrix = grown
+        self._count += 1
+        return self._count - 1
+
+    # -------------------------------------------------------------------------
+    # Search
+    # -------------------------------------------------------------------------
+    def search(self, query: Sequence[float], top_k: int = 5) -> List[Tuple[str, str, float]]:
+        """[(doc_id, text_content, cosine score)] best first."""
+        q = np.asarray(query, dtype=np.float32)
+        q = q / max(float(np.linalg.norm(q)), 1e-10)
+        with self._lock:
+            count = self._count
+            if not count or top_k <= 0:
+                return []
+            matrix = self._matrix[:count]
+            candidates = self._ann_search(q, top_k, count)
+            if candidates is None:
+                candidates = np.arange(count)
+                scores = matrix @ q
+            else:
+                scores = matrix[candidates] @ q
+            k = min(top_k, len(candidates))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self._ids[candidates[i]], self._texts[candidates[i]], float(scores[i])) for i in top]
+
+    def _ann_search(self, q: np.ndarray, top_k: int, count: int) -> Optional[np.ndarray]:
+        if not self.ann or count < self.ann_min_rows:
+            return None
+        if self._ann_index is None:
+            # Exact search until the background build lands
+            self._start_ann_build(count)
+            return None
+        if self._ann_rows < count:
+            self._ann_index.add(self._matrix[self._ann_rows:count])
+            self._ann_rows = count
+        _, found = self._ann_index.search(q[None, :], min(count, top_k * self.ann_candidates))
+        found = found[0]
+        return found[found >= 0]
+
+    # -------------------------------------------------------------------------
+    # HNSW rebuild (off the request path)
+    # -------------------------------------------------------------------------
+    def _discard_ann(self):
+        self._ann_index = None
+        self._ann_rows = 0
+        self._ann_generation += 1
+
+    def _start_ann_build(self, count: int):
+        """Called with the lock held; at most one build runs at a time."""
+        if self._ann_building:
+            return
+        self._ann_building = True
+        self._ann_build_rows = count
+        threading.Thread(target=self._build_ann, args=(self._matrix[:count], self._ann_generation),
+                         name="hnsw-build", daemon=True).start()
+
+    def _build_ann(self, rows: np.ndarray, generation: int):
+        """
+        Build the index outside the lock. rows is a view of the live matrix:
+        appends land past it, and anything that rewrites it bumps the
+        generation, so a stale build is dropped and the next search starts
+        another.
+        """
+        try:
+            index = faiss.IndexHNSWFlat(rows.shape[1], self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efSearch = self.hnsw_ef_search
+            index.add(rows)
+        except Exception as e:
+            print("HNSW build failed, using exact search:", e)
+            self.ann = False
+            index = None
+        with self._lock:
+            self._ann_building = False
+            self._ann_build_rows = 0
+            if index is not None and generation == self._ann_generation:
+                # Rows appended meanwhile are added by the next search
+                self._ann_index, self._ann_rows = index, len(rows)
@@ -0,0 +1,141 @@
+"""
+web_ingest.py
+
+Incremental crawl step for the webcontent /ingest endpoint:
+- Expands sitemaps (and sitemap indexes) into page URLs
+- Fetches pages concurrently over one pooled session, sending
+  If-None-Match / If-Modified-Since from the WEB_PAGES table
+- Hashes the extracted content, so pages that were re-served but did not change
+  are skipped before chunking and embedding
+"""
+
+import hashlib
+import json
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+import requests
+from sqlalchemy import bindparam, text
+
+_SITEMAP_NS = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+
+MERGE_PAGE_SQL = (
+    "MERGE INTO WEB_PAGES p "
+    "USING (SELECT :url AS url FROM dual) src "
+    "ON (p.url = src.url) "
+    "WHEN MATCHED THEN UPDATE SET etag = :etag, last_modified = :last_modified, "
+    "content_hash = :content_hash, chunk_count = :chunk_count, fetched_at = SYSTIMESTAMP "
+    "WHEN NOT MATCHED THEN INSERT (url, etag, last_modified, content_hash, chunk_count, fetched_at) "
+    "VALUES (:url, :etag, :last_modified, :content_hash, :chunk_count, SYSTIMESTAMP)"
+)
+
+
+def make_session(pool_size: int = 16, user_agent: str = "webcontent-ingest/1.0") -> requests.Session:
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = user_agent
+    return session
+
+
+def content_hash(content: Any) -> str:
+    """sha256 of extracted text, or of the JSON form of structured content (e.g. sections)."""
+    if not isinstance(content, str):
+        content = json.dumps(content, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def expand_sitemap(session: requests.Session, url: str, timeout: float = 20, limit: int = 5000) -> List[str]:
+    """Page URLs listed in a sitemap; nested sitemap indexes are followed."""
+    urls, pending, seen = [], [url], set()
+    while pending and len(urls) < limit:
+        sitemap = pending.pop(0)
+        if sitemap in seen:
+            continue
+        seen.add(sitemap)
+        resp = session.get(sitemap, timeout=timeout)
+        resp.raise_for_status()
+        root = ET.fromstring(resp.content)
+        locs = [loc.text.strip() for loc in root.iter(f"{_SITEMAP_NS}loc") if loc.text]
+        if root.tag == f"{_SITEMAP_NS}sitemapindex":
+            pending.extend(locs)
+        else:
+            urls.extend(locs)
+    return urls[:limit]
+
+
+def load_page_state(engine, urls: Iterable[str], batch: int = 500) -> Dict[str, Dict]:
+    """WEB_PAGES rows for the given URLs, keyed by URL."""
+    urls = list(urls)
+    query = text(
+        "SELECT url, etag, last_modified, content_hash, chunk_count FROM WEB_PAGES WHERE url IN :urls"
+    ).bindparams(bindparam("urls", expanding=True))
+    state = {}
+    with engine.connect() as conn:
+        for start in range(0, len(urls), batch):
+            for url, etag, last_modified, hash_, chunks in conn.execute(query, {"urls": urls[start:start + batch]}):
+                state[url] = {"etag": etag, "last_modified": last_modified,
+                              "content_hash": hash_, "chunk_count": chunks or 0}
+    return state
+
+
+def save_page_state(conn, pages: List[Dict]):
+    if pages:
+        conn.execute(text(MERGE_PAGE_SQL), [
+            {k: p.get(k) for k in ("url", "etag", "last_modified", "content_hash", "chunk_count")}
+            for p in pages
+        ])
+
+
+def fetch_pages(session: requests.Session, urls: Iterable[str], state: Dict[str, Dict],
+                extract: Callable[[bytes], Any], workers: int = 8, timeout: float = 20,
+                force: bool = False) -> Iterator[Dict]:
+    """
+    Fetch and extract pages concurrently; yields one result per URL, in input order:
+      {"url", "status": "changed" | "unchanged" | "same_hash" | "error", ...}
+    extract gets the raw body (so the parser can honour the page's charset).
+    "changed" results carry its output as "content", plus "content_hash",
+    "etag", "last_modified" and "previous_chunks" (chunk count stored for the
+    previous version).
+    """
+
+    def fetch(url):
+        known = {} if force else state.get(url, {})
+        headers = {}
+        if known.get("etag"):
+            headers["If-None-Match"] = known["etag"]
+        if known.get("last_modified"):
+            headers["If-Modified-Since"] = known["last_modified"]
+        try:
+            resp = session.get(url, headers=headers, timeout=timeout)
+            if resp.status_code == 304:
+                return {"url": url, "status": "unchanged"}
+            resp.raise_for_status()
+            content = extract(resp.content)
+        except Exception as e:
+            return {"url": url, "status": "error", "error": str(e)}
+
+        hash_ = content_hash(content)
+        result = {
+            "url": url,
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+            "content_hash": hash_,
+            "previous_chunks": state.get(url, {}).get("chunk_count", 0),
+        }
+        if hash_ == known.get("content_hash"):
+            # Same content under new validators: remember them, skip re-embedding
+            result.update(status="same_hash", chunk_count=known.get("chunk_count", 0))
+        else:
+            result.update(status="changed", content=content)
+        return result
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="web-fetch") as pool:
+        yield from pool.map(fetch, dict.fromkeys(urls))
+
+
+def stale_doc_ids(url: str, chunk_count: int, previous_chunks: Optional[int]) -> List[str]:
+    """Chunk ids left over when a page shrank since the last ingest."""
+    return [f"{url}__{i}" for i in range(chunk_count, previous_chunks or 0)]